@@ -0,0 +1,122 @@
+"""
+Shared loader for data/Aquifer_Petrignano.csv
+
+The CSV is parsed once with an explicit date format ("%d/%m/%Y", no per-row
+format inference) and saved as a binary NumPy cache (.npz) next to the other
+runtime state. Later loads read the cache unless the CSV changed (its
+modification time or size differ), and repeated loads in the same process
+reuse the arrays already in memory.
+
+Usage:
+    from ai_models.dataset import load_dataset, load_columns, forecast_frame
+    df = load_dataset()                                  # DataFrame, Date as datetime64
+    dates, depth = load_columns("Date", "Depth_to_Groundwater_P24")  # typed NumPy arrays
+    df, features = forecast_frame()                      # LSTM inputs (train + forecast)
+    version = data_version()                             # changes when the CSV changes
+"""
+
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_PATH = BASE_DIR / "data" / "Aquifer_Petrignano.csv"
+CACHE_DIR = Path(os.getenv("DATASET_CACHE_DIR", str(BASE_DIR / "data" / "state")))
+
+DATE_COLUMN = "Date"
+DATE_FORMAT = "%d/%m/%Y"
+
+# path -> (source key, {column: array}, column order)
+_memory = {}
+_lock = threading.Lock()
+
+
+def _source_key(path: Path) -> np.ndarray:
+    stat = os.stat(path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def _parse_csv(path: Path) -> tuple:
+    df = pd.read_csv(path, encoding="utf-8-sig")
+    columns = {DATE_COLUMN: pd.to_datetime(df[DATE_COLUMN], format=DATE_FORMAT).to_numpy(dtype="datetime64[ns]")}
+    for name in df.columns:
+        if name != DATE_COLUMN:
+            columns[name] = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)
+    return columns, list(df.columns)
+
+
+def _load(path: Path) -> tuple:
+    key = _source_key(path)
+
+    with _lock:
+        cached = _memory.get(path)
+        if cached is not None and np.array_equal(cached[0], key):
+            return cached[1], cached[2]
+
+        cache_path = CACHE_DIR / f"{path.stem}.npz"
+        columns = None
+        if cache_path.is_file():
+            with np.load(cache_path, allow_pickle=False) as archive:
+                if np.array_equal(archive["source_key"], key):
+                    order = archive["columns"].tolist()
+                    columns = {name: archive[f"col_{i}"] for i, name in enumerate(order)}
+
+        if columns is None:
+            columns, order = _parse_csv(path)
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # Write then rename so a concurrent reader never sees a half-written cache
+            tmp_path = cache_path.with_suffix(".tmp.npz")
+            np.savez(
+                tmp_path,
+                source_key=key,
+                columns=np.array(order),
+                **{f"col_{i}": columns[name] for i, name in enumerate(order)},
+            )
+            os.replace(tmp_path, cache_path)
+
+        _memory[path] = (key, columns, order)
+        return columns, order
+
+
+def data_version(path=DATA_PATH) -> str:
+    """Identifies the current content of the CSV (changes when the file is modified)."""
+    mtime_ns, size = _source_key(Path(path))
+    return f"{mtime_ns}-{size}"
+
+
+def load_columns(*names: str, path=DATA_PATH) -> tuple:
+    """Read-only NumPy arrays of the requested columns (Date is datetime64[ns], others float64)."""
+    columns, _ = _load(Path(path))
+    views = []
+    for name in names:
+        view = columns[name].view()
+        view.flags.writeable = False
+        views.append(view)
+    return tuple(views)
+
+
+def load_dataset(path=DATA_PATH) -> pd.DataFrame:
+    """The whole dataset as a new DataFrame (callers may modify it freely)."""
+    columns, order = _load(Path(path))
+    return pd.DataFrame({name: columns[name].copy() for name in order})
+
+
+def forecast_frame(
+    target_column="Depth_to_Groundwater_P24",
+    temp_column="Temperature_Petrignano",
+    path=DATA_PATH,
+) -> tuple:
+    """
+    Inputs shared by the LSTM training and forecasting code:
+    the dataset with `hour` / `day_of_week` added and the features forward-filled.
+    """
+    df = load_dataset(path)
+    df["hour"] = 0
+    df["day_of_week"] = df[DATE_COLUMN].dt.dayofweek
+
+    features = [target_column, temp_column, "hour", "day_of_week"]
+    df[features] = df[features].ffill()
+    return df, features
@@ -9,6 +9,12 @@ Key updates in this version:
 2. Rolling window fixed: ensured shapes are compatible for NumPy concatenation and updates.
 3. Model and scaler paths updated to point to the root-level `models/` folder.
 4. Fully ready to integrate with Operations Research (OR) modules.
+5. Dataset read through `ai_models.dataset` (dates parsed once with an explicit format, cached as .npz).
+6. An already loaded model and scaler can be passed in (the API serves them from the model registry).
+7. `forecast_multi` forecasts several wells at once: their windows are stacked into one batch,
+   so each step is one model call whatever the number of wells.
+8. `strategy="direct"` uses the multi-output model (`train_model.py --direct`), which emits the
+   whole horizon in one forward pass instead of one model call per step.
 
 Usage:
     from lstm_for_or import forecast_for_or
@@ -27,6 +33,7 @@ from datetime import timedelta
 from tensorflow.keras.models import load_model
 import joblib
 import os
+import sys
 
 # -------------------------------
 # Automatic base directory
@@ -34,55 +41,104 @@ import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 DATA_PATH = os.path.join(BASE_DIR, "data", "Aquifer_Petrignano.csv")
 
+# Shared dataset loader (parsed once, cached as .npz)
+try:
+    from ai_models.dataset import forecast_frame
+except ImportError:
+    sys.path.append(BASE_DIR)
+    from ai_models.dataset import forecast_frame
+
 # Models are in the root-level 'models/' folder
 MODEL_PATH = os.path.join(BASE_DIR, "models", "water_forecast_model.h5")
+DIRECT_MODEL_PATH = os.path.join(BASE_DIR, "models", "water_forecast_direct_model.h5")
 SCALER_PATH = os.path.join(BASE_DIR, "models", "scaler.pkl")
 
+def _direct_rollout(model, scaler, last_sequence, steps):
+    """
+    One forward pass gives the model's whole horizon; longer forecasts chain
+    passes on the predicted values (exogenous features carried forward).
+    """
+    last_features = last_sequence[-1, 1:]
+    predicted_scaled = []
+    while len(predicted_scaled) < steps:
+        block = model.predict_on_batch(last_sequence[None].astype(np.float32))[0]
+        predicted_scaled.extend(block)
+        rows = np.column_stack([block, np.tile(last_features, (len(block), 1))])
+        last_sequence = np.vstack([last_sequence, rows])[-len(last_sequence):]
+
+    rows = np.column_stack([predicted_scaled[:steps], np.tile(last_features, (steps, 1))])
+    return list(scaler.inverse_transform(rows)[:, 0])
+
+
+def _scale(scaler, frame):
+    # A scaler is fitted on one well's columns: refuse to apply its min/max to another well
+    fitted = list(getattr(scaler, "feature_names_in_", frame.columns))
+    if fitted != list(frame.columns):
+        raise ValueError(
+            f"Scaler was fitted on {fitted}, not {list(frame.columns)}; "
+            f"train a model and scaler for this well (train_lstm_model(target_column=...))"
+        )
+    return scaler.transform(frame)
+
 # --------------------------------------------------
 # Forecast Function for OR
 # --------------------------------------------------
 def forecast_for_or(
     steps=24,
     target_column="Depth_to_Groundwater_P24",
-    temp_column="Temperature_Petrignano"
+    temp_column="Temperature_Petrignano",
+    model=None,
+    scaler=None,
+    strategy="recursive"
 ):
-
-    # Load trained model and scaler
-    model = load_model(MODEL_PATH, compile=False)  # compile=False fixes H5 load issue
-    scaler = joblib.load(SCALER_PATH)
-
-    # Load data
-    df = pd.read_csv(DATA_PATH)
-    df["Date"] = pd.to_datetime(df["Date"], dayfirst=True)
-    df["hour"] = 0
-    df["day_of_week"] = df["Date"].dt.dayofweek
-
-    features = [target_column, temp_column, "hour", "day_of_week"]
-    df[features] = df[features].ffill()
-
-    scaled_data = scaler.transform(df[features])
+    """
+    strategy="recursive": next-step model called once per step on its own predictions.
+    strategy="direct": multi-output model returning its whole horizon per call.
+    """
+    if strategy not in ("recursive", "direct"):
+        raise ValueError(f"Unknown strategy: {strategy}")
+
+    # Load trained model and scaler (unless the caller already holds them)
+    if model is None:
+        model_path = MODEL_PATH if strategy == "recursive" else DIRECT_MODEL_PATH
+        if strategy == "direct" and not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"Direct forecast model not found at {model_path}: train it first with "
+                "`python ai_models/demand_forecasting/train_model.py --direct`"
+            )
+        model = load_model(model_path, compile=False)  # compile=False fixes H5 load issue
+    if scaler is None:
+        scaler = joblib.load(SCALER_PATH)
+
+    # Load data (cached, dates parsed with an explicit format)
+    df, features = forecast_frame(target_column, temp_column, path=DATA_PATH)
+
+    scaled_data = _scale(scaler, df[features])
 
     # Prepare last 12 steps
     window_size = 12
     last_sequence = scaled_data[-window_size:]
     predictions = []
 
-    for _ in range(steps):
-        input_seq = np.expand_dims(last_sequence, axis=0)
-        next_pred_scaled = model.predict(input_seq, verbose=0)[0][0]
+    if strategy == "direct":
+        predictions = _direct_rollout(model, scaler, last_sequence, steps)
+    else:
+        for _ in range(steps):
+            input_seq = np.expand_dims(last_sequence, axis=0)
+            next_pred_scaled = model.predict_on_batch(input_seq.astype(np.float32))[0][0]
 
-        # --- FIXED SHAPE ISSUE ---
-        last_features = last_sequence[-1, 1:].reshape(1, -1)          # shape (1, n-1)
-        next_pred_scaled_2d = np.array([[next_pred_scaled]])          # shape (1,1)
-        next_full_scaled = np.concatenate([next_pred_scaled_2d, last_features], axis=1)
+            # --- FIXED SHAPE ISSUE ---
+            last_features = last_sequence[-1, 1:].reshape(1, -1)          # shape (1, n-1)
+            next_pred_scaled_2d = np.array([[next_pred_scaled]])          # shape (1,1)
+            next_full_scaled = np.concatenate([next_pred_scaled_2d, last_features], axis=1)
 
-        # inverse scaling
-        next_pred = scaler.inverse_transform(next_full_scaled)[0][0]
-        predictions.append(next_pred)
+            # inverse scaling
+            next_pred = scaler.inverse_transform(next_full_scaled)[0][0]
+            predictions.append(next_pred)
 
-        # update rolling window (FIXED)
-        next_row_scaled = np.hstack([next_pred_scaled_2d, last_sequence[-1, 1:].reshape(1, -1)])
-        last_sequence = np.vstack([last_sequence[1:], next_row_scaled])
+            # update rolling window (FIXED)
+            next_row_scaled = np.hstack([next_pred_scaled_2d, last_sequence[-1, 1:].reshape(1, -1)])
+            last_sequence = np.vstack([last_sequence[1:], next_row_scaled])
 
     # Build OR-ready DataFrame
     last_date = df["Date"].iloc[-1]
@@ -94,10 +150,87 @@ def forecast_for_or(
 
     return forecast_df
 
+# --------------------------------------------------
+# Batched forecast for several wells
+# --------------------------------------------------
+def forecast_multi(
+    target_columns=("Depth_to_Groundwater_P24",),
+    steps=24,
+    temp_column="Temperature_Petrignano",
+    model=None,
+    scalers=None
+):
+    """
+    Same rollout as `forecast_for_or` for every column in `target_columns`,
+    with the windows of all wells stacked into one (n_wells, 12, n_features)
+    batch: one model call per step instead of one per well and step.
+    `scalers` maps each well to the scaler fitted on its columns (default: the
+    saved scaler for every well, which raises for wells it was not fitted on).
+    Returns a DataFrame with `Timestamp` and one predicted-depth column per well.
+    """
+    if model is None:
+        model = load_model(MODEL_PATH, compile=False)
+    if scalers is None:
+        saved = joblib.load(SCALER_PATH)
+        scalers = {target_column: saved for target_column in target_columns}
+
+    window_size = 12
+    windows = []
+    for target_column in target_columns:
+        df, features = forecast_frame(target_column, temp_column, path=DATA_PATH)
+        windows.append(_scale(scalers[target_column], df[features])[-window_size:])
+    batch = np.stack(windows).astype(np.float32)           # (n_wells, window, n_features)
+
+    # Exogenous features of the last row are carried forward, as in forecast_for_or
+    last_features = batch[:, -1, 1:]
+    predictions_scaled = np.empty((steps, len(windows)), dtype=np.float32)
+
+    for step in range(steps):
+        # predict_on_batch: no per-call tf.data pipeline as with model.predict
+        next_scaled = model.predict_on_batch(batch)[:, 0]
+        predictions_scaled[step] = next_scaled
+
+        next_rows = np.concatenate([next_scaled[:, None], last_features], axis=1)
+        batch = np.concatenate([batch[:, 1:], next_rows[:, None, :]], axis=1)
+
+    # Inverse scaling of all steps of a well at once, with that well's scaler
+    predictions = np.column_stack([
+        scalers[target_column].inverse_transform(
+            np.column_stack([predictions_scaled[:, i], np.tile(last_features[i], (steps, 1))])
+        )[:, 0]
+        for i, target_column in enumerate(target_columns)
+    ])
+
+    last_date = df["Date"].iloc[-1]
+    forecast_df = pd.DataFrame(predictions, columns=list(target_columns))
+    forecast_df.insert(0, "Timestamp", [last_date + timedelta(hours=i+1) for i in range(steps)])
+
+    return forecast_df
+
 # --------------------------------------------------
 # Run test
 # --------------------------------------------------
 if __name__ == "__main__":
     forecast = forecast_for_or(steps=24)
     print("\n📊 24-Hour Forecast for OR Model:\n")
-    print(forecast)
\ No newline at end of file
+    print(forecast)
+
+    # One rollout per well vs one batched rollout, both with predict_on_batch
+    # (16 wells simulated by repeating P24, the well the saved scaler was fitted on)
+    import time
+    model = load_model(MODEL_PATH, compile=False)
+    scaler = joblib.load(SCALER_PATH)
+    wells = ["Depth_to_Groundwater_P24"] * 16
+
+    started = time.perf_counter()
+    per_well = [forecast_for_or(24, well, model=model, scaler=scaler) for well in wells]
+    sequential_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = forecast_multi(wells, 24, model=model, scalers={well: scaler for well in wells})
+    batched_s = time.perf_counter() - started
+
+    max_diff = max(np.abs(batched.iloc[:, i + 1].to_numpy() - f["Predicted_Depth"].to_numpy()).max()
+                   for i, f in enumerate(per_well))
+    print(f"\n{len(wells)} wells x 24 steps: per well {sequential_s:.2f}s, batched {batched_s:.2f}s "
+          f"(max difference {max_diff:.2e})")
@@ -1,10 +1,14 @@
-import pandas as pd
+import threading
+from collections import Counter
+
 import numpy as np
+import tensorflow as tf
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense
 from sklearn.preprocessing import MinMaxScaler
 import joblib
 import os
+import sys
 import matplotlib.pyplot as plt
 
 
@@ -18,16 +22,40 @@ BASE_DIR = os.path.dirname(
 
 DATA_PATH = os.path.join(BASE_DIR, "data", "Aquifer_Petrignano.csv")
 
+# Shared dataset loader (parsed once, cached as .npz)
+try:
+    from ai_models.dataset import forecast_frame
+except ImportError:
+    sys.path.append(BASE_DIR)
+    from ai_models.dataset import forecast_frame
+
 
 # Helper function to create sequences
 
-def create_sequences(data, window_size=12):
+def create_sequences(data, window_size=12, horizon=1):
+    """
+    horizon=1: y is the next target value (recursive model).
+    horizon>1: y holds the next `horizon` target values (direct multi-output model).
+    """
     X, y = [], []
-    for i in range(len(data) - window_size):
+    for i in range(len(data) - window_size - horizon + 1):
         X.append(data[i:i+window_size])
-        y.append(data[i+window_size][0])
+        if horizon == 1:
+            y.append(data[i+window_size][0])
+        else:
+            y.append(data[i+window_size:i+window_size+horizon, 0])
     return np.array(X), np.array(y)
 
+
+def build_lstm(input_shape, horizon=1):
+    # Same network for both modes; only the output layer width changes
+    model = Sequential()
+    model.add(LSTM(64, input_shape=input_shape))
+    model.add(Dense(32, activation="relu"))
+    model.add(Dense(horizon))
+    model.compile(optimizer="adam", loss="mse")
+    return model
+
 # -------------------------------
 # Main training function
 # -------------------------------
@@ -37,17 +65,16 @@ def train_lstm_model(
     epochs=20,
     batch_size=32,
     target_column="Depth_to_Groundwater_P24",
-    temp_column="Temperature_Petrignano"
+    temp_column="Temperature_Petrignano",
+    horizon=1
 ):
-    # Load data
-    df = pd.read_csv(data_path)
-
-    df["Date"] = pd.to_datetime(df["Date"], dayfirst=True)
-    df["hour"] = 0
-    df["day_of_week"] = df["Date"].dt.dayofweek
-
-    features = [target_column, temp_column, "hour", "day_of_week"]
-    df[features] = df[features].ffill()
+    """
+    horizon=1 trains the next-step model rolled out recursively by forecast_for_or
+    (water_forecast_model.h5). horizon>1 trains a direct model emitting the next
+    `horizon` steps in one forward pass (water_forecast_direct_model.h5).
+    """
+    # Load data (cached, dates parsed with an explicit format)
+    df, features = forecast_frame(target_column, temp_column, path=data_path)
 
     # Scale features
     scaler = MinMaxScaler()
@@ -58,20 +85,17 @@ def train_lstm_model(
     joblib.dump(scaler, os.path.join(model_dir, "scaler.pkl"))
 
     # Create sequences
-    X, y = create_sequences(scaled_data, window_size=12)
+    X, y = create_sequences(scaled_data, window_size=12, horizon=horizon)
 
     # Build LSTM
-    model = Sequential()
-    model.add(LSTM(64, input_shape=(X.shape[1], X.shape[2])))
-    model.add(Dense(32, activation="relu"))
-    model.add(Dense(1))
-    model.compile(optimizer="adam", loss="mse")
+    model = build_lstm((X.shape[1], X.shape[2]), horizon)
 
     # Train
     history = model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=1)
 
     # Save model
-    model.save(os.path.join(model_dir, "water_forecast_model.h5"))
+    model_name = "water_forecast_model.h5" if horizon == 1 else "water_forecast_direct_model.h5"
+    model.save(os.path.join(model_dir, model_name))
 
     # -------------------------------
     # Plot training loss
@@ -90,8 +114,9 @@ def train_lstm_model(
     y_pred = model.predict(X)
 
     plt.figure(figsize=(12,4))
-    plt.plot(y[:100], label='True')
-    plt.plot(y_pred[:100], label='Predicted')
+    # Next-step values (first output of the direct model)
+    plt.plot(y.reshape(len(y), -1)[:100, 0], label='True')
+    plt.plot(y_pred[:100, 0], label='Predicted')
     plt.title('Groundwater Depth Predictions (First 100 points)')
     plt.xlabel('Time step')
     plt.ylabel('Scaled Depth')
@@ -104,7 +129,7 @@ def train_lstm_model(
     last_sequence = scaled_data[-12:]
     last_sequence_input = np.expand_dims(last_sequence, axis=0)
 
-    next_pred_scaled = model.predict(last_sequence_input)
+    next_pred_scaled = model.predict(last_sequence_input)[:, :1]
 
     last_features = last_sequence[-1, 1:].reshape(1, -1)
 
@@ -118,12 +143,157 @@ def train_lstm_model(
 
 
 # -------------------------------
-# Run
+# Recursive vs direct benchmark
 # -------------------------------
-if __name__ == "__main__":
-    train_lstm_model()
-    def predict_demand(model, data):
-    data = np.array(data).reshape(1, -1, 1)
-    prediction = model.predict(data)
+def benchmark_strategies(
+    horizon=24,
+    epochs=10,
+    target_column="Depth_to_Groundwater_P24",
+    temp_column="Temperature_Petrignano"
+):
+    """
+    Trains a recursive (next step) and a direct (whole horizon) model on the
+    first 80% of the data and compares them on the last 20%: error per lead
+    time of a `horizon`-step forecast, and latency of one forecast.
+    """
+    import time
+
+    df, features = forecast_frame(target_column, temp_column)
+    scaled_data = df[features].to_numpy(dtype=np.float64)
+    split = int(0.8 * len(scaled_data))
+    scaler = MinMaxScaler().fit(scaled_data[:split])
+    scaled_data = scaler.transform(scaled_data)
+
+    X_train, y_train = create_sequences(scaled_data[:split], 12)
+    recursive = build_lstm(X_train.shape[1:])
+    recursive.fit(X_train, y_train, epochs=epochs, batch_size=32, verbose=0)
+
+    X_train, y_train = create_sequences(scaled_data[:split], 12, horizon)
+    direct = build_lstm(X_train.shape[1:], horizon)
+    direct.fit(X_train, y_train, epochs=epochs, batch_size=32, verbose=0)
+
+    X_test, y_test = create_sequences(scaled_data[split - 12:], 12, horizon)
+
+    # Recursive rollout of every test window at once (exogenous features carried forward)
+    windows = X_test.astype(np.float32)
+    recursive_pred = np.empty_like(y_test)
+    for step in range(horizon):
+        next_scaled = recursive.predict_on_batch(windows)[:, 0]
+        recursive_pred[:, step] = next_scaled
+        next_rows = np.concatenate([next_scaled[:, None], windows[:, -1, 1:]], axis=1)
+        windows = np.concatenate([windows[:, 1:], next_rows[:, None, :]], axis=1)
+    direct_pred = direct.predict_on_batch(X_test.astype(np.float32))
+
+    # Back to metres (target column of the MinMax scaler)
+    to_metres = scaler.data_max_[0] - scaler.data_min_[0]
+    recursive_mae = np.abs(recursive_pred - y_test).mean(axis=0) * to_metres
+    direct_mae = np.abs(direct_pred - y_test).mean(axis=0) * to_metres
+
+    # Latency of one forecast (one window)
+    window = X_test[-1:].astype(np.float32)
+    runs = 20
+    started = time.perf_counter()
+    for _ in range(runs):
+        sequence = window
+        for _ in range(horizon):
+            next_scaled = recursive.predict_on_batch(sequence)
+            next_row = np.concatenate([next_scaled, sequence[:, -1, 1:]], axis=1)
+            sequence = np.concatenate([sequence[:, 1:], next_row[:, None, :]], axis=1)
+    recursive_ms = 1000 * (time.perf_counter() - started) / runs
+    started = time.perf_counter()
+    for _ in range(runs):
+        direct.predict_on_batch(window)
+    direct_ms = 1000 * (time.perf_counter() - started) / runs
+
+    print(f"{len(X_test)} test forecasts of {horizon} steps")
+    print(f"{'strategy':<12}{'latency ms':>12}{'MAE step 1':>12}{f'MAE step {horizon}':>13}{'MAE mean':>10}")
+    for name, ms, mae in (("recursive", recursive_ms, recursive_mae), ("direct", direct_ms, direct_mae)):
+        print(f"{name:<12}{ms:>12.1f}{mae[0]:>12.3f}{mae[-1]:>13.3f}{mae.mean():>10.3f}")
+
+
+# -------------------------------
+# Demand prediction with fixed input shapes
+# -------------------------------
+# Every new sequence length used to trace a new TF graph (hundreds of ms).
+# Inputs are now padded / truncated to one of these lengths, so at most
+# len(DEMAND_BUCKETS) graphs exist per model and all of them are traced
+# by prewarm_demand() before the model serves requests.
+DEMAND_BUCKETS = (12, 24, 48, 96, 168)
+
+_trace_counts = Counter()                # bucket length -> graph traces
+_bucket_counts = Counter()               # bucket length -> requests
+_stats_lock = threading.Lock()
+
+
+def bucket_length(n):
+    """Smallest bucket holding n values (the largest bucket for longer inputs)."""
+    for length in DEMAND_BUCKETS:
+        if n <= length:
+            return length
+    return DEMAND_BUCKETS[-1]
+
+
+def fit_to_bucket(values):
+    """
+    Most recent values, left-padded with the oldest one up to the bucket
+    length (a flat history) or truncated to the last DEMAND_BUCKETS[-1].
+    """
+    values = np.asarray(values, dtype=np.float32).reshape(-1)
+    if values.size == 0:
+        raise ValueError("Demand history is empty")
+    length = bucket_length(values.size)
+    values = values[-length:]
+    return np.pad(values, (length - values.size, 0), mode="edge")
+
+
+def _compiled_call(model):
+    # Kept on the model itself: the function and its graphs are freed with
+    # the model when the registry drops an old version
+    call = getattr(model, "_demand_call", None)
+    if call is None:
+        @tf.function
+        def call(x):
+            # Python side effect: only runs while TF traces a new graph
+            with _stats_lock:
+                _trace_counts[int(x.shape[1])] += 1
+            return model(x, training=False)
+        model._demand_call = call
+    return call
+
+
+def prewarm_demand(model):
+    """Traces the graph of every bucket so no request pays for it."""
+    call = _compiled_call(model)
+    for length in DEMAND_BUCKETS:
+        call(tf.zeros((1, length, 1)))
+
+
+def demand_trace_stats():
+    with _stats_lock:
+        return {
+            "buckets": list(DEMAND_BUCKETS),
+            "traces": sum(_trace_counts.values()),
+            "traces_by_length": dict(_trace_counts),
+            "requests_by_length": dict(_bucket_counts),
+        }
+
+
+def predict_demand(model, data):
+    values = fit_to_bucket(data)
+    with _stats_lock:
+        _bucket_counts[values.size] += 1
+    prediction = _compiled_call(model)(tf.constant(values.reshape(1, -1, 1)))
 
     return {"next_hour_demand": float(prediction[0][0])}
+
+
+# -------------------------------
+# Run
+# -------------------------------
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_strategies()
+    elif "--direct" in sys.argv:
+        train_lstm_model(horizon=24)
+    else:
+        train_lstm_model()
@@ -0,0 +1,90 @@
+"""
+Shared forecast cache with single-flight computation
+
+Forecasts only change when the data (or the model) changes, so the API
+computes each (data version, model version, target, steps) forecast once
+and serves it to every caller. Concurrent misses on the same key are
+deduplicated: the first caller computes, the others wait for its result
+instead of running the same TensorFlow rollout in parallel. Entries of an
+older data version are dropped as soon as a newer one is computed.
+
+Usage:
+    from ai_models.forecast_cache import forecast_cache
+    result, cached = forecast_cache.get(key, lambda: forecast_for_or(...))
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Forecasts kept in memory (different targets / horizons of the current data)
+MAX_ENTRIES = 64
+
+
+class ForecastCache:
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> result
+        self.in_flight = {}           # key -> Future of the running computation
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0               # callers that waited for another caller's computation
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, compute) -> tuple:
+        """
+        Returns (result, cached). key[0] is the data version: storing a result
+        evicts the entries of every other data version.
+        """
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key], True
+
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not owner:
+            # Re-raises the computing caller's error, if any
+            return future.result(), True
+
+        try:
+            result = compute()
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            for stale in [k for k in self.entries if k[0] != key[0]]:
+                del self.entries[stale]
+            self.entries[key] = result
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            del self.in_flight[key]
+        future.set_result(result)
+        return result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "in_flight": len(self.in_flight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "errors": self.errors,
+            }
+
+
+forecast_cache = ForecastCache()
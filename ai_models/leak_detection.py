@@ -21,10 +21,10 @@ FEATURES = [
 
 class LeakDetector:
 
-    def __init__(self):
+    def __init__(self, model_path=MODEL_PATH, scaler_path=SCALER_PATH):
         """Load model and scaler once"""
-        self.model = joblib.load(MODEL_PATH)
-        self.scaler = joblib.load(SCALER_PATH)
+        self.model = joblib.load(model_path)
+        self.scaler = joblib.load(scaler_path)
 
     def predict(self, data_dict):
         """
@@ -0,0 +1,260 @@
+"""
+Versioned model registry with background warm-up and atomic swap
+
+Each model name ("leak", "demand", "forecast") has versions stored as
+directories holding the same artifact files as the original fixed paths:
+
+    models/registry/<name>/<version>/leak_detection_model.pkl, ...
+
+The artifacts at the original locations are served as version "legacy".
+
+Deploying a version loads and warms it (one prediction on a sample input)
+in a background thread while the current version keeps serving; the new
+version is then swapped in with a single reference assignment, so a request
+always runs entirely on one version. The previous loaded versions stay in
+memory for an immediate rollback. The active version of every model is
+saved in models/registry/active.json and restored at startup.
+
+Usage:
+    from ai_models.model_registry import registry
+    registry.register("leak", loader, warmup)
+    registry.deploy("leak", "2024-06-01", wait=True)
+    with registry.use("leak") as model:           # counts calls/latency per version
+        result = model.predict(sensor_dict)
+    registry.rollback("leak")
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+REGISTRY_DIR = Path(os.getenv("MODEL_REGISTRY_DIR", str(BASE_DIR / "models" / "registry")))
+
+LEGACY_VERSION = "legacy"
+
+# Loaded versions kept in memory per model (active + rollback targets)
+KEEP_LOADED = 3
+
+
+class ModelVersion:
+    """A loaded, warmed model plus its usage counters."""
+
+    def __init__(self, name: str, version: str, model, load_ms: float, warmup_ms: float):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.load_ms = load_ms
+        self.warmup_ms = warmup_ms
+        self.loaded_at = time.time()
+        self.calls = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_used = None
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, failed: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self.latency_total += elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+            self.last_used = time.time()
+
+    @contextmanager
+    def track(self):
+        """Records the duration and outcome of the enclosed call."""
+        started = time.perf_counter()
+        failed = True
+        try:
+            yield self.model
+            failed = False
+        finally:
+            self.record(time.perf_counter() - started, failed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "loaded_at": self.loaded_at,
+                "load_ms": round(self.load_ms, 1),
+                "warmup_ms": round(self.warmup_ms, 1),
+                "calls": self.calls,
+                "errors": self.errors,
+                "avg_latency_ms": round(1000 * self.latency_total / self.calls, 3) if self.calls else 0.0,
+                "max_latency_ms": round(1000 * self.latency_max, 3),
+                "last_used": self.last_used,
+            }
+
+
+class ModelRegistry:
+
+    def __init__(self, root: Path = REGISTRY_DIR):
+        self.root = Path(root)
+        self.specs = {}       # name -> (loader, warmup, legacy directory)
+        self.active = {}      # name -> ModelVersion
+        self.previous = {}    # name -> [ModelVersion], most recent last
+        self.loading = {}     # name -> version being loaded
+        self.failures = {}    # name -> last deploy error
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable, warmup: Optional[Callable] = None,
+                 legacy_dir=None) -> None:
+        """
+        loader(directory) -> model; warmup(model) runs one prediction.
+        legacy_dir holds the artifacts served as version "legacy".
+        """
+        self.specs[name] = (loader, warmup, Path(legacy_dir) if legacy_dir else None)
+
+    def version_dir(self, name: str, version: str) -> Path:
+        if version == LEGACY_VERSION:
+            legacy_dir = self.specs[name][2]
+            if legacy_dir is None:
+                raise FileNotFoundError(f"No legacy artifacts for model {name}")
+            return legacy_dir
+        # Version names are single path components
+        if not version or Path(version).name != version or version.startswith("."):
+            raise ValueError(f"Invalid version name: {version!r}")
+        return self.root / name / version
+
+    def versions(self, name: str) -> list:
+        directory = self.root / name
+        stored = sorted(p.name for p in directory.iterdir() if p.is_dir()) if directory.is_dir() else []
+        return ([LEGACY_VERSION] if self.specs[name][2] else []) + stored
+
+    def _load(self, name: str, version: str) -> ModelVersion:
+        loader, warmup, _ = self.specs[name]
+        directory = self.version_dir(name, version)
+        if not directory.is_dir():
+            raise FileNotFoundError(f"Model {name} has no version {version}")
+
+        started = time.perf_counter()
+        model = loader(directory)
+        loaded = time.perf_counter()
+        if warmup is not None:
+            warmup(model)
+        warmed = time.perf_counter()
+        return ModelVersion(name, version, model, 1000 * (loaded - started), 1000 * (warmed - loaded))
+
+    def _swap(self, name: str, loaded: ModelVersion) -> None:
+        with self._lock:
+            current = self.active.get(name)
+            if current is not None:
+                history = [v for v in self.previous.get(name, []) if v.version != loaded.version]
+                history.append(current)
+                self.previous[name] = history[-(KEEP_LOADED - 1):]
+            self.active[name] = loaded
+        self._save_active()
+        print(f"Model {name}: version {loaded.version} active "
+              f"(load {loaded.load_ms:.0f} ms, warm-up {loaded.warmup_ms:.0f} ms)")
+
+    def deploy(self, name: str, version: str, wait: bool = False) -> bool:
+        """
+        Loads, warms and swaps in `version`. Returns False if a deploy of this
+        model is already running. With wait=False the work runs in a background
+        thread; errors are kept in `failures` and the current version stays active.
+        """
+        if name not in self.specs:
+            raise KeyError(name)
+        self.version_dir(name, version)  # validate the name before starting
+
+        with self._lock:
+            if name in self.loading:
+                return False
+            self.loading[name] = version
+            self.failures.pop(name, None)
+
+        def run():
+            try:
+                self._swap(name, self._load(name, version))
+            except Exception as e:
+                self.failures[name] = {"version": version, "error": str(e)}
+                print(f"Model {name}: deploy of version {version} failed:", e)
+                if wait:
+                    raise
+            finally:
+                with self._lock:
+                    self.loading.pop(name, None)
+
+        if wait:
+            run()
+        else:
+            threading.Thread(target=run, name=f"model-deploy-{name}", daemon=True).start()
+        return True
+
+    def rollback(self, name: str) -> Optional[str]:
+        """
+        Swaps back to the previous loaded version and unloads the current one
+        (deploy it again to roll forward). Returns the restored version, None
+        if there is none in memory.
+        """
+        with self._lock:
+            history = self.previous.get(name)
+            if not history:
+                return None
+            target = history.pop()
+            self.active[name] = target
+        self._save_active()
+        print(f"Model {name}: rolled back to version {target.version}")
+        return target.version
+
+    def get(self, name: str) -> ModelVersion:
+        version = self.active.get(name)
+        if version is None:
+            raise LookupError(f"Model {name} is not loaded")
+        return version
+
+    @contextmanager
+    def use(self, name: str):
+        """Yields the active model and records the call on the version that served it."""
+        with self.get(name).track() as model:
+            yield model
+
+    def _saved(self) -> dict:
+        active_file = self.root / "active.json"
+        if not active_file.is_file():
+            return {}
+        with open(active_file, encoding="utf-8") as file_handle:
+            return json.load(file_handle)
+
+    def _save_active(self) -> None:
+        # Merged into the saved file: models not loaded yet keep their saved version
+        with self._lock:
+            active = {name: v.version for name, v in self.active.items()}
+        try:
+            active = {**self._saved(), **active}
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.root / "active.json.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file_handle:
+                json.dump(active, file_handle, indent=2)
+            os.replace(tmp_path, self.root / "active.json")
+        except (OSError, ValueError) as e:
+            print("Could not save active model versions:", e)
+
+    def saved_version(self, name: str) -> str:
+        """Version recorded as active for `name`, "legacy" if none."""
+        return self._saved().get(name, LEGACY_VERSION)
+
+    def status(self) -> dict:
+        with self._lock:
+            active = dict(self.active)
+            previous = {name: list(history) for name, history in self.previous.items()}
+            loading = dict(self.loading)
+        return {
+            name: {
+                "active": active[name].stats() if name in active else None,
+                "previous": [v.stats() for v in reversed(previous.get(name, []))],
+                "loading": loading.get(name),
+                "last_failure": self.failures.get(name),
+                "available": self.versions(name),
+            }
+            for name in self.specs
+        }
+
+
+registry = ModelRegistry()
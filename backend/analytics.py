@@ -0,0 +1,55 @@
+# backend/analytics.py
+
+# Trend aggregation for the dashboard analytics panel.
+# Series are built from the day rollups of the time-series store and
+# regrouped to weeks or months with vectorized NumPy operations, so the
+# dashboard only receives the aggregated points.
+
+import numpy as np
+
+try:
+    from backend.timeseries_store import COUNT, METRICS, SUM, from_seconds
+except ImportError:
+    from timeseries_store import COUNT, METRICS, SUM, from_seconds
+
+
+PERIODS = ("daily", "weekly", "monthly")
+
+
+def period_start(days: np.ndarray, period: str) -> np.ndarray:
+    """
+    Maps datetime64[D] days to the first day of their period.
+    Weeks start on Monday, like pandas' to_period("W").
+    """
+    if period == "weekly":
+        # 1970-01-01 was a Thursday: (day + 3) % 7 is the weekday with Monday = 0
+        return days - (days.astype(np.int64) + 3) % 7
+    if period == "monthly":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    return days
+
+
+def flow_trends(store, device_ids: list, period: str = "daily") -> list:
+    """
+    Total and average flow rate per period over the given devices.
+    """
+    keys, rows = store.query_buckets(device_ids, "day")
+    if len(keys) == 0:
+        return []
+
+    days = np.array([from_seconds(k) for k in keys], dtype="datetime64[D]")
+    buckets, inverse = np.unique(period_start(days, period), return_inverse=True)
+
+    flow = rows[:, METRICS.index("flow_rate"), :]
+    totals = np.bincount(inverse, weights=flow[:, SUM], minlength=len(buckets))
+    counts = np.bincount(inverse, weights=flow[:, COUNT], minlength=len(buckets))
+
+    return [
+        {
+            "period": str(bucket),
+            "flow_total": float(total),
+            "flow_mean": float(total / count) if count else 0.0,
+            "count": int(count),
+        }
+        for bucket, total, count in zip(buckets, totals, counts)
+    ]
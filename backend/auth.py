@@ -1,18 +1,161 @@
+import hashlib
+import json
 import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
 from fastapi import HTTPException, Security
 from fastapi.security import APIKeyHeader
-from jose import jwt
+from jose import JWTError, jwt
 
 API_KEY_HEADER = APIKeyHeader(name="Authorization")
+ADMIN_KEY_HEADER = APIKeyHeader(name="X-Admin-Key")
 
 DEVICE_API_KEY = os.getenv("DEVICE_API_KEY")
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
 JWT_SECRET = os.getenv("JWT_SECRET")
+JWT_TTL = int(os.getenv("JWT_TTL", "3600"))
 
-def verify_api_key(api_key: str = Security(API_KEY_HEADER)):
-    if api_key != DEVICE_API_KEY:
+# Per-device keys, stored as SHA-256 hashes: {"device_id": "hex digest"}
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEVICE_KEYS_FILE = os.getenv("DEVICE_KEYS_FILE", str(ROOT_DIR / "data" / "state" / "device_keys.json"))
+
+# Identity of every caller using the legacy shared DEVICE_API_KEY. The
+# client-supplied X-Device-ID header is not trusted to tell them apart.
+SHARED_KEY_DEVICE = "device"
+
+TOKEN_CACHE_SIZE = 10_000
+
+def hash_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+class DeviceKeyRegistry:
+    """
+    Hashed device keys -> device id. Verifying a key is one SHA-256 and
+    one dict lookup; plain keys are never kept.
+    """
+
+    def __init__(self):
+        self.devices = {}  # key hash -> device_id
+        self._lock = threading.Lock()
+
+    def load(self, path: str = DEVICE_KEYS_FILE) -> int:
+        devices = {}
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as file_handle:
+                devices = {digest: device_id for device_id, digest in json.load(file_handle).items()}
+        if DEVICE_API_KEY:
+            devices[hash_key(DEVICE_API_KEY)] = SHARED_KEY_DEVICE
+        with self._lock:
+            self.devices = devices
+        return len(devices)
+
+    def save(self, path: str = DEVICE_KEYS_FILE) -> None:
+        with self._lock:
+            entries = {d: digest for digest, d in self.devices.items() if d != SHARED_KEY_DEVICE}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file_handle:
+            json.dump(entries, file_handle, indent=2)
+        os.replace(tmp_path, path)
+
+    def issue(self, device_id: str) -> str:
+        """Creates a new key for the device (replacing its previous one) and returns it once."""
+        api_key = secrets.token_urlsafe(32)
+        with self._lock:
+            self.devices = {digest: d for digest, d in self.devices.items() if d != device_id}
+            self.devices[hash_key(api_key)] = device_id
+        return api_key
+
+    def lookup(self, api_key: str):
+        return self.devices.get(hash_key(api_key))
+
+device_keys = DeviceKeyRegistry()
+
+class TokenCache:
+    """
+    LRU of already-verified JWTs -> (claims, expiry). A cached token is
+    accepted without decoding until it expires.
+    """
+
+    def __init__(self, capacity: int = TOKEN_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self.entries.get(token)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self.entries[token]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, claims: dict, expires: float) -> None:
+        with self._lock:
+            self.entries[token] = (claims, expires)
+            self.entries.move_to_end(token)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+token_cache = TokenCache()
+
+def verify_token(token: str) -> dict:
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    if not JWT_SECRET:
+        raise HTTPException(status_code=401, detail="Invalid Token")
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid Token")
+    # Tokens without an expiry are only trusted for one JWT_TTL before being decoded again
+    token_cache.put(token, claims, claims.get("exp", time.time() + JWT_TTL))
+    return claims
+
+def _authenticate(credential: str) -> str:
+    if credential.startswith("Bearer "):
+        device_id = verify_token(credential[len("Bearer "):]).get("sub")
+    else:
+        device_id = device_keys.lookup(credential)
+    if device_id is None:
         raise HTTPException(status_code=401, detail="Invalid API Key")
+    return device_id
+
+def verify_api_key(api_key: str = Security(API_KEY_HEADER)):
+    """Device key or `Bearer <JWT>`; returns the authenticated device id."""
+    return _authenticate(api_key)
+
+def verify_admin_key(api_key: str = Security(ADMIN_KEY_HEADER)):
+    # Admin endpoints stay closed when no admin key is configured
+    if not ADMIN_API_KEY or api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid Admin Key")
     return api_key
 
+def device_identity(headers):
+    """
+    Device id of a request carrying device credentials (device key or
+    `Bearer <JWT>` in Authorization), None when it carries none.
+    Wrong credentials are rejected. The shared key gives SHARED_KEY_DEVICE.
+    """
+    credential = headers.get("Authorization")
+    if not credential:
+        return None
+    return _authenticate(credential)
+
 def create_token(user_id: str):
-    payload = {"sub": user_id}
+    payload = {"sub": user_id, "exp": int(time.time()) + JWT_TTL}
     return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
@@ -1,75 +1,174 @@
+import threading
 from datetime import datetime
 
-# Global state tracking for the system
-command_history = []  # List of dictionaries to store all action logs
-pump_state = "STOPPED"  # Initial state of the pump
-valve_state = "CLOSED"  # Initial state of the valve
+try:
+    from backend.event_log import event_log
+except ImportError:
+    from event_log import event_log
 
+# Zone used when a command does not name one (single-site installations)
+DEFAULT_ZONE = "default"
 
-def log_command(device, command, status):
+# Valid transitions per device type: command -> (required state, new state)
+TRANSITIONS = {
+    "pump": {"START": ("STOPPED", "RUNNING"), "STOP": ("RUNNING", "STOPPED")},
+    "valve": {"OPEN": ("CLOSED", "OPEN"), "CLOSE": ("OPEN", "CLOSED")},
+}
+INITIAL_STATE = {"pump": "STOPPED", "valve": "CLOSED"}
+
+
+def log_command(device, command, status, zone=DEFAULT_ZONE):
     """
-    Creates a standardized log entry and appends it to the global history.
+    Creates a standardized log entry and queues it for the durable event log.
     Returns the created entry dictionary.
     """
     entry = {
         "device": device,
+        "zone": zone,
         "command": command,
         "status": status,
         "timestamp": datetime.now().isoformat()
     }
 
-    command_history.append(entry)
+    event_log.log_command(entry)
     return entry
 
 
-def control_pump(command):
+class DeviceStateManager:
     """
-    Handles the logic for starting and stopping the pump.
-    Prevents redundant commands (e.g., starting an already running pump).
+    State of every (device, zone) pair, each guarded by its own lock.
+    Commands on different pumps/valves never wait on each other; commands on
+    the same one are serialized so the check-then-set cannot race.
     """
-    global pump_state
-
-    # Validation: Prevent the pump from being set to its current state
-    if command == "START" and pump_state == "RUNNING":
-        return log_command("pump", command, "FAILED")
 
-    if command == "STOP" and pump_state == "STOPPED":
-        return log_command("pump", command, "FAILED")
-
-    # Update state based on valid input
-    if command == "START":
-        pump_state = "RUNNING"
-    elif command == "STOP":
-        pump_state = "STOPPED"
-
-    return log_command("pump", command, "SUCCESS")
+    def __init__(self):
+        self._states = {}         # (device, zone) -> state
+        self._locks = {}          # (device, zone) -> Lock
+        self._registry_lock = threading.Lock()
+
+    def _lock_for(self, key: tuple) -> threading.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            with self._registry_lock:
+                lock = self._locks.setdefault(key, threading.Lock())
+        return lock
+
+    def _apply_locked(self, device: str, command: str, zone: str) -> dict:
+        transition = TRANSITIONS.get(device, {}).get(command)
+        key = (device, zone)
+        current = self._states.get(key, INITIAL_STATE.get(device))
+
+        # Validation: unknown commands and commands that do not change the state fail
+        if transition is None or current != transition[0]:
+            return log_command(device, command, "FAILED", zone)
+
+        self._states[key] = transition[1]
+        return log_command(device, command, "SUCCESS", zone)
+
+    def apply(self, device: str, command: str, zone: str = DEFAULT_ZONE) -> dict:
+        with self._lock_for((device, zone)):
+            return self._apply_locked(device, command, zone)
+
+    def apply_many(self, commands: list) -> list:
+        """
+        Applies [(device, command, zone), ...] as one batch: the locks of all
+        targeted devices are taken (in sorted order, so concurrent batches
+        cannot deadlock) and commands run in the given order.
+        """
+        keys = sorted({(device, zone) for device, _, zone in commands})
+        locks = [self._lock_for(key) for key in keys]
+        for lock in locks:
+            lock.acquire()
+        try:
+            return [self._apply_locked(device, command, zone) for device, command, zone in commands]
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def state(self, device: str, zone: str = DEFAULT_ZONE) -> str:
+        return self._states.get((device, zone), INITIAL_STATE.get(device))
+
+    def snapshot(self) -> list:
+        with self._registry_lock:
+            keys = list(self._locks)
+        return [
+            {"device": device, "zone": zone, "state": self.state(device, zone)}
+            for device, zone in sorted(keys)
+        ]
+
+
+device_states = DeviceStateManager()
+
+
+def control_pump(command, zone=DEFAULT_ZONE):
+    """
+    Handles the logic for starting and stopping the pump of a zone.
+    Prevents redundant commands (e.g., starting an already running pump).
+    """
+    return device_states.apply("pump", command, zone)
 
 
-def control_valve(command):
+def control_valve(command, zone=DEFAULT_ZONE):
     """
-    Handles the logic for opening and closing the valve.
+    Handles the logic for opening and closing the valve of a zone.
     Ensures the valve cannot be 'opened' if it is already open.
     """
-    global valve_state
-
-    # Validation: Ensure command changes the current state
-    if command == "OPEN" and valve_state == "OPEN":
-        return log_command("valve", command, "FAILED")
-
-    if command == "CLOSE" and valve_state == "CLOSED":
-        return log_command("valve", command, "FAILED")
-
-    # Update state based on valid input
-    if command == "OPEN":
-        valve_state = "OPEN"
-    elif command == "CLOSE":
-        valve_state = "CLOSED"
-
-    return log_command("valve", command, "SUCCESS")
+    return device_states.apply("valve", command, zone)
 
 
-def get_history():
+def get_history(**filters):
     """
-    Retrieves the complete list of logged actions for the system.
+    Retrieves one page of logged actions, newest first
+    (device, zone, start, end, limit, before_id).
+    Returns {"items": [...], "next_before_id": ...}; callers of the former
+    full-list version read `items` and follow the cursor.
     """
-    return command_history
\ No newline at end of file
+    return event_log.commands(**filters)
+
+
+# --------------------------------------------------
+# Concurrent throughput benchmark
+# --------------------------------------------------
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    try:
+        from backend.event_log import EventLog
+    except ImportError:
+        from event_log import EventLog
+
+    THREADS, COMMANDS, ZONES = 16, 20000, 64
+
+    # Keep benchmark commands out of the real event log
+    directory = tempfile.TemporaryDirectory()
+    event_log = EventLog(os.path.join(directory.name, "events.db"))
+
+    def worker(seed):
+        entries = []
+        for i in range(COMMANDS):
+            zone = f"zone_{(seed * 7 + i) % ZONES}"
+            entries.append(control_pump("START" if (i // ZONES) % 2 == 0 else "STOP", zone))
+        return entries
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        history = [entry for entries in pool.map(worker, range(THREADS)) for entry in entries]
+    elapsed = time.perf_counter() - started
+    event_log.close()
+    directory.cleanup()
+
+    # Every successful START must be matched by a STOP, except for running pumps
+    balance = {}
+    for entry in history:
+        if entry["status"] == "SUCCESS":
+            balance[entry["zone"]] = balance.get(entry["zone"], 0) + (1 if entry["command"] == "START" else -1)
+    consistent = all(
+        balance.get(f"zone_{z}", 0) == (device_states.state("pump", f"zone_{z}") == "RUNNING")
+        for z in range(ZONES)
+    )
+
+    print(f"{len(history)} commands from {THREADS} threads in {elapsed:.2f}s "
+          f"({len(history) / elapsed:,.0f} commands/s), state consistent: {consistent}")
@@ -0,0 +1,192 @@
+# backend/device_registry.py
+
+# Registry of field devices (id, zone, coordinates, type) with a uniform
+# grid spatial index. Bounding-box and nearest-neighbour queries only
+# visit the grid cells that can contain results, so they stay fast with
+# tens of thousands of sensors; zone lookups use a zone -> ids index.
+
+import json
+import math
+import os
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEVICES_FILE = os.getenv("DEVICES_FILE", str(ROOT_DIR / "data" / "devices.json"))
+
+# Grid cell size in degrees (~1 km in latitude)
+DEFAULT_CELL_SIZE = 0.01
+
+EARTH_RADIUS_M = 6_371_000
+
+
+@dataclass
+class Device:
+    device_id: str
+    zone: str
+    lat: float
+    lon: float
+    type: str = "flow_sensor"
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class DeviceRegistry:
+    """
+    Devices by id, by zone and by grid cell.
+    """
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.devices = {}   # device_id -> Device
+        self.zones = {}     # zone -> set of device_id
+        self.grid = {}      # (cell_x, cell_y) -> set of device_id
+        self.bounds = None  # (min_x, min_y, max_x, max_y) of cells ever used
+        self._lock = threading.Lock()
+
+    def _cell(self, lat: float, lon: float) -> tuple:
+        return int(math.floor(lon / self.cell_size)), int(math.floor(lat / self.cell_size))
+
+    def register(self, device: Device) -> None:
+        """Adds a device, or moves it if the id is already known."""
+        with self._lock:
+            self._remove(device.device_id)
+            self.devices[device.device_id] = device
+            self.zones.setdefault(device.zone, set()).add(device.device_id)
+            x, y = self._cell(device.lat, device.lon)
+            self.grid.setdefault((x, y), set()).add(device.device_id)
+
+            if self.bounds is None:
+                self.bounds = (x, y, x, y)
+            else:
+                min_x, min_y, max_x, max_y = self.bounds
+                self.bounds = (min(min_x, x), min(min_y, y), max(max_x, x), max(max_y, y))
+
+    def remove(self, device_id: str) -> bool:
+        with self._lock:
+            return self._remove(device_id)
+
+    def _remove(self, device_id: str) -> bool:
+        device = self.devices.pop(device_id, None)
+        if device is None:
+            return False
+
+        zone = self.zones[device.zone]
+        zone.discard(device_id)
+        if not zone:
+            del self.zones[device.zone]
+
+        cell_key = self._cell(device.lat, device.lon)
+        cell = self.grid[cell_key]
+        cell.discard(device_id)
+        if not cell:
+            del self.grid[cell_key]
+        return True
+
+    def get(self, device_id: str) -> Optional[Device]:
+        return self.devices.get(device_id)
+
+    def zone_names(self) -> list:
+        return sorted(self.zones)
+
+    def in_zone(self, zone: str) -> list:
+        with self._lock:
+            return [self.devices[d] for d in sorted(self.zones.get(zone, ()))]
+
+    def all(self) -> list:
+        with self._lock:
+            return list(self.devices.values())
+
+    # ===============================
+    # Spatial Queries
+    # ===============================
+    def bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> list:
+        """Devices inside the bounding box (inclusive)."""
+        x0, y0 = self._cell(min_lat, min_lon)
+        x1, y1 = self._cell(max_lat, max_lon)
+        found = []
+
+        with self._lock:
+            # Scan whichever is smaller: the covered cells or the occupied cells
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(self.grid):
+                cells = (self.grid.get((x, y)) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+            else:
+                cells = (ids for (x, y), ids in self.grid.items() if x0 <= x <= x1 and y0 <= y <= y1)
+
+            for ids in cells:
+                for device_id in ids or ():
+                    device = self.devices[device_id]
+                    if min_lat <= device.lat <= max_lat and min_lon <= device.lon <= max_lon:
+                        found.append(device)
+
+        return found
+
+    def nearest(self, lat: float, lon: float, k: int = 1, max_distance_m: Optional[float] = None) -> list:
+        """
+        The k devices closest to (lat, lon) as (distance_m, Device), closest first.
+        Searches rings of grid cells outwards and stops once no unvisited cell
+        can hold a closer device than the current k-th result.
+        """
+        if k < 1:
+            return []
+        cx, cy = self._cell(lat, lon)
+        # Smallest ground distance covered by one cell (longitude shrinks with latitude)
+        cell_m = self.cell_size * 111_320 * max(math.cos(math.radians(min(abs(lat), 89.0))), 0.01)
+        results = []
+
+        with self._lock:
+            if not self.devices:
+                return []
+
+            min_x, min_y, max_x, max_y = self.bounds
+            max_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy, 0)
+
+            for ring in range(max_ring + 1):
+                for x in range(cx - ring, cx + ring + 1):
+                    for y in range(cy - ring, cy + ring + 1):
+                        if max(abs(x - cx), abs(y - cy)) != ring:
+                            continue
+                        for device_id in self.grid.get((x, y), ()):
+                            device = self.devices[device_id]
+                            results.append((haversine_m(lat, lon, device.lat, device.lon), device))
+
+                # Any device in ring r+1 or beyond is at least r cells away
+                if len(results) >= k:
+                    results.sort(key=lambda item: item[0])
+                    if results[k - 1][0] <= ring * cell_m:
+                        break
+
+        results.sort(key=lambda item: item[0])
+        if max_distance_m is not None:
+            results = [item for item in results if item[0] <= max_distance_m]
+        return results[:k]
+
+    # ===============================
+    # Persistence
+    # ===============================
+    def load_json(self, path: str = DEVICES_FILE) -> int:
+        """Loads a JSON list of devices; returns how many were registered."""
+        if not os.path.isfile(path):
+            return 0
+        with open(path, encoding="utf-8") as file_handle:
+            for entry in json.load(file_handle):
+                self.register(Device(**entry))
+        return len(self.devices)
+
+    def save_json(self, path: str = DEVICES_FILE) -> None:
+        # Write then rename: a crash mid-write never leaves a truncated registry
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file_handle:
+            json.dump([asdict(d) for d in self.all()], file_handle, indent=2)
+        os.replace(tmp_path, path)
@@ -0,0 +1,213 @@
+# backend/device_stats.py
+
+# Per-device streaming statistics used for adaptive leak thresholds.
+#
+# Each device gets one slot in a set of preallocated NumPy arrays holding
+# an exponentially weighted mean/variance of its flow rate, the last value
+# and its rate of change. Updating a device is O(1) and memory is bounded
+# by `capacity`: when full, the least recently seen device is evicted.
+# The state can be saved to / restored from an .npz file across restarts.
+# Times are float seconds in the wall-clock convention of the time-series
+# store (`to_seconds`), for single readings and batches alike.
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+try:
+    from backend.timeseries_store import from_seconds, to_seconds
+except ImportError:
+    from timeseries_store import from_seconds, to_seconds
+
+
+# Weight of the newest reading in the EWMA (about a 20 reading memory)
+DEFAULT_ALPHA = 0.05
+
+# A reading this many standard deviations above the device mean is anomalous
+DEFAULT_Z_THRESHOLD = 4.0
+
+# Readings needed before a device baseline is trusted
+DEFAULT_WARMUP = 30
+
+# Floor on the standard deviation, avoids huge z-scores for flat signals
+MIN_STD = 0.5
+
+DEFAULT_CAPACITY = 50_000
+
+
+class DeviceStats:
+    """
+    Online EWMA statistics per device_id, stored in compact arrays.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, alpha: float = DEFAULT_ALPHA,
+                 z_threshold: float = DEFAULT_Z_THRESHOLD, warmup: int = DEFAULT_WARMUP):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+
+        self.mean = np.zeros(capacity)
+        self.var = np.zeros(capacity)
+        self.last_value = np.zeros(capacity)
+        self.last_time = np.zeros(capacity)   # epoch seconds of the last reading
+        self.rate = np.zeros(capacity)        # last rate of change (units per second)
+        self.count = np.zeros(capacity, dtype=np.int64)
+
+        # device_id -> slot, ordered from least to most recently seen
+        self.slots = OrderedDict()
+        self.free = list(range(capacity - 1, -1, -1))
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _slot(self, device_id: str) -> int:
+        slot = self.slots.get(device_id)
+        if slot is not None:
+            self.slots.move_to_end(device_id)
+            return slot
+
+        if self.free:
+            slot = self.free.pop()
+        else:
+            _, slot = self.slots.popitem(last=False)
+            self.evictions += 1
+
+        self.count[slot] = 0
+        self.slots[device_id] = slot
+        return slot
+
+    def _update(self, device_id: str, value: float, timestamp: Optional[float]) -> tuple:
+        slot = self._slot(device_id)
+        now = timestamp if timestamp is not None else to_seconds(None)
+        n = self.count[slot]
+
+        if n == 0:
+            self.mean[slot] = value
+            self.var[slot] = 0.0
+            self.rate[slot] = 0.0
+            zscore = 0.0
+        else:
+            # Score against the baseline *before* this reading is absorbed
+            std = max(np.sqrt(self.var[slot]), MIN_STD)
+            diff = value - self.mean[slot]
+            zscore = diff / std
+
+            dt = now - self.last_time[slot]
+            self.rate[slot] = (value - self.last_value[slot]) / dt if dt > 0 else 0.0
+
+            increment = self.alpha * diff
+            self.mean[slot] += increment
+            self.var[slot] = (1 - self.alpha) * (self.var[slot] + diff * increment)
+
+        self.last_value[slot] = value
+        self.last_time[slot] = now
+        self.count[slot] = n + 1
+
+        anomaly = bool(n >= self.warmup and zscore >= self.z_threshold)
+        return slot, float(zscore), anomaly
+
+    def update(self, device_id: str, value: float, timestamp: Optional[datetime] = None) -> dict:
+        """Absorbs one reading and returns how it compares to the device baseline."""
+        with self._lock:
+            slot, zscore, anomaly = self._update(
+                device_id, value, to_seconds(timestamp)
+            )
+            return {
+                "baseline_mean": round(float(self.mean[slot]), 4),
+                "baseline_std": round(float(np.sqrt(self.var[slot])), 4),
+                "rate_of_change": round(float(self.rate[slot]), 6),
+                "zscore": round(zscore, 3),
+                "anomaly": anomaly,
+            }
+
+    def update_many(self, device_ids, values, timestamps=None):
+        """
+        Absorbs a batch of readings in order.
+        Returns (zscores, anomaly_mask) as NumPy arrays.
+        """
+        size = len(values)
+        zscores = np.zeros(size)
+        anomalies = np.zeros(size, dtype=bool)
+
+        if timestamps is not None:
+            seconds = timestamps.astype("datetime64[ms]").astype(np.float64) / 1000.0
+            missing = np.isnat(timestamps)
+        else:
+            seconds, missing = None, None
+
+        with self._lock:
+            for i in range(size):
+                ts = None if seconds is None or missing[i] else seconds[i]
+                _, zscores[i], anomalies[i] = self._update(device_ids[i], float(values[i]), ts)
+
+        return zscores, anomalies
+
+    def get(self, device_id: str) -> Optional[dict]:
+        slot = self.slots.get(device_id)
+        if slot is None:
+            return None
+        return {
+            "device_id": device_id,
+            "count": int(self.count[slot]),
+            "mean": float(self.mean[slot]),
+            "std": float(np.sqrt(self.var[slot])),
+            "last_value": float(self.last_value[slot]),
+            "last_time": from_seconds(self.last_time[slot]).isoformat(),
+            "rate_of_change": float(self.rate[slot]),
+            "warmed_up": bool(self.count[slot] >= self.warmup),
+        }
+
+    # ===============================
+    # Snapshot / Restore
+    # ===============================
+    def snapshot(self, path) -> int:
+        """Saves the state of every known device; returns the number of devices saved."""
+        with self._lock:
+            ids = list(self.slots.keys())  # LRU order is preserved
+            slots = np.fromiter(self.slots.values(), dtype=np.int64, count=len(ids))
+
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                device_ids=np.array(ids, dtype=str),
+                mean=self.mean[slots],
+                var=self.var[slots],
+                last_value=self.last_value[slots],
+                last_time=self.last_time[slots],
+                rate=self.rate[slots],
+                count=self.count[slots],
+            )
+            os.replace(tmp_path, path)
+            return len(ids)
+
+    def restore(self, path) -> int:
+        """Loads a snapshot written by snapshot(); returns the number of devices restored."""
+        if not os.path.isfile(path):
+            return 0
+
+        with np.load(path) as npz:
+            saved = {name: npz[name] for name in npz.files}
+
+        ids = saved["device_ids"]
+        # Keep the most recently seen devices if the snapshot is larger than capacity
+        start = max(0, len(ids) - self.capacity)
+
+        with self._lock:
+            self.slots.clear()
+            self.free = list(range(self.capacity - 1, -1, -1))
+
+            for i in range(start, len(ids)):
+                slot = self._slot(str(ids[i]))
+                self.mean[slot] = saved["mean"][i]
+                self.var[slot] = saved["var"][i]
+                self.last_value[slot] = saved["last_value"][i]
+                self.last_time[slot] = saved["last_time"][i]
+                self.rate[slot] = saved["rate"][i]
+                self.count[slot] = saved["count"][i]
+
+            return len(self.slots)
@@ -0,0 +1,101 @@
+# backend/event_bus.py
+
+# In-process publish/subscribe of new readings and alerts.
+#
+# Ingest handlers run in the threadpool and publish synchronously; each
+# subscriber (one per open /events connection) owns a bounded asyncio
+# queue fed through call_soon_threadsafe. A subscriber that cannot keep up
+# loses the oldest events instead of slowing down ingestion, and can
+# resynchronise from the sequence number carried by every event.
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+
+# Events buffered per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Recent events kept for clients reconnecting with Last-Event-ID
+REPLAY_SIZE = 500
+
+# Comment line sent on idle connections so proxies keep them open
+KEEPALIVE_SECONDS = 15
+
+
+class Subscriber:
+
+    def __init__(self, loop, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, event: dict) -> None:
+        """Runs on the event loop thread."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventBus:
+    """
+    Fans out events to every connected subscriber.
+    """
+
+    def __init__(self, replay_size: int = REPLAY_SIZE):
+        self.version = 0
+        self.subscribers = set()
+        self.recent = deque(maxlen=replay_size)
+        self._lock = threading.Lock()
+
+    def publish(self, kind: str, data: dict) -> int:
+        """Thread-safe; returns the sequence number given to the event."""
+        with self._lock:
+            self.version += 1
+            event = {"id": self.version, "event": kind, "time": time.time(), "data": data}
+            self.recent.append(event)
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                # Event loop already closed (server shutting down)
+                self.subscribers.discard(subscriber)
+
+        return event["id"]
+
+    def subscribe(self, last_event_id: int = 0) -> Subscriber:
+        """Must be called from the event loop; replays events newer than last_event_id."""
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            for event in self.recent:
+                if event["id"] > last_event_id:
+                    subscriber.offer(event)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    async def sse(self, last_event_id: int = 0):
+        """Yields the server-sent-events stream of one client."""
+        subscriber = self.subscribe(last_event_id)
+        try:
+            yield f"retry: 3000\nevent: hello\ndata: {json.dumps({'version': self.version})}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+event_bus = EventBus()
@@ -0,0 +1,277 @@
+# backend/event_log.py
+
+# Durable log of control commands and leak alerts on SQLite (WAL mode).
+#
+# Callers never wait for the disk: rows are queued and a single writer
+# thread inserts them in batches (one transaction per batch). WAL lets
+# readers query while the writer commits. A query only waits for the rows
+# queued before it (by sequence number), never for the queue to drain.
+# Queries are newest first and use
+# keyset pagination (`before_id` cursor) along the (device, timestamp) indexes.
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+EVENT_LOG_PATH = os.getenv("EVENT_LOG_PATH", str(ROOT_DIR / "data" / "state" / "events.db"))
+SCHEMA_PATH = Path(__file__).resolve().parent / "schema.sql"
+
+# Writer batching: insert as soon as this many rows are waiting, or after this delay
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.05
+
+MAX_PAGE_SIZE = 1000
+
+COMMAND_COLUMNS = ["device", "zone", "command", "status", "timestamp"]
+ALERT_COLUMNS = ["device_id", "flow_rate", "water_level", "temperature", "status", "timestamp"]
+
+TABLES = {
+    "control_commands": (COMMAND_COLUMNS, "device"),
+    "alerts": (ALERT_COLUMNS, "device_id"),
+}
+
+# Columns added after the first release: CREATE TABLE IF NOT EXISTS leaves
+# existing databases unchanged, so they are added with ALTER TABLE at start
+MIGRATIONS = {
+    "control_commands": {"zone": "TEXT"},
+}
+
+# Longest a query waits for rows queued before it to be committed (seconds)
+READ_WAIT_TIMEOUT = 1.0
+
+
+class EventLog:
+    """
+    Batched SQLite writer plus paginated range queries.
+    """
+
+    def __init__(self, path: str = EVENT_LOG_PATH):
+        self.path = path
+        self._queue = queue.Queue()
+        self._writer = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        # Each queued row gets a sequence number; readers wait for the
+        # number they observed, not for the queue to be empty
+        self._enqueued = 0
+        self._committed = 0
+        self._seq_lock = threading.Lock()
+        self._committed_cond = threading.Condition()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def start(self) -> None:
+        """Creates the database and starts the writer thread (idempotent)."""
+        with self._start_lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            with closing(self._connect()) as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA_PATH.read_text(encoding="utf-8"))
+                self._migrate(connection)
+            self._writer = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+            self._writer.start()
+
+    @staticmethod
+    def _migrate(connection: sqlite3.Connection) -> None:
+        for table, added in MIGRATIONS.items():
+            existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in added.items():
+                if column not in existing:
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        connection.commit()
+
+    def close(self) -> None:
+        """Writes everything still queued and stops the writer."""
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        with self._committed_cond:
+            self._writer = None
+            self._committed_cond.notify_all()
+
+    # ===============================
+    # Writes
+    # ===============================
+    def _put(self, table: str, values: tuple) -> None:
+        self.start()
+        # Numbering and queueing under one lock keeps the queue in sequence order
+        with self._seq_lock:
+            self._enqueued += 1
+            self._queue.put((self._enqueued, table, values))
+
+    def log_command(self, entry: dict) -> None:
+        self._put("control_commands", tuple(entry.get(c) for c in COMMAND_COLUMNS))
+
+    def log_alert(self, alert: dict) -> None:
+        self._put("alerts", tuple(alert.get(c) for c in ALERT_COLUMNS))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until every row queued before the call is committed (rows queued
+        meanwhile are not waited for). Returns False on timeout.
+        """
+        target = self._enqueued
+        with self._committed_cond:
+            return self._committed_cond.wait_for(
+                lambda: self._committed >= target or self._writer is None, timeout=timeout
+            )
+
+    def _run(self) -> None:
+        connection = self._connect()
+        # WAL + NORMAL: a commit only waits for the WAL append, not a full fsync
+        connection.execute("PRAGMA synchronous=NORMAL")
+        statements = {
+            table: f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            for table, (columns, _) in TABLES.items()
+        }
+        stopping = False
+
+        while not stopping:
+            item = self._queue.get()
+            batch = [item]
+            try:
+                while len(batch) < BATCH_SIZE:
+                    batch.append(self._queue.get(timeout=FLUSH_INTERVAL) if len(batch) == 1
+                                 else self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            rows = {table: [] for table in TABLES}
+            last_seq = None
+            for entry in batch:
+                if entry is None:
+                    stopping = True
+                else:
+                    last_seq, table, values = entry
+                    rows[table].append(values)
+
+            try:
+                with connection:
+                    for table, values in rows.items():
+                        if values:
+                            connection.executemany(statements[table], values)
+                self.written += len(batch) - stopping
+            except sqlite3.Error as e:
+                print("Error writing event log:", e)
+            finally:
+                # Failed rows count as done too, so readers never wait on them
+                if last_seq is not None:
+                    with self._committed_cond:
+                        self._committed = last_seq
+                        self._committed_cond.notify_all()
+
+        connection.close()
+
+    # ===============================
+    # Queries
+    # ===============================
+    def query(self, table: str, device: Optional[str] = None, start: Optional[str] = None,
+              end: Optional[str] = None, limit: int = 100, before_id: Optional[int] = None,
+              **filters) -> dict:
+        """
+        Newest-first page of `table`. `start`/`end` bound the timestamp
+        (inclusive); pass the returned `next_before_id` to get the next page.
+        """
+        self.start()
+        # Read-your-writes for rows queued before the query, bounded under load
+        self.flush(timeout=READ_WAIT_TIMEOUT)
+        columns, device_column = TABLES[table]
+        clauses, params = [], []
+
+        if device is not None:
+            clauses.append(f"{device_column} = ?")
+            params.append(device)
+        for column, value in filters.items():
+            if value is not None and column in columns:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        if before_id is not None:
+            # Keyset cursor on the index order (timestamp, id)
+            clauses.append(f"(timestamp, id) < (SELECT timestamp, id FROM {table} WHERE id = ?)")
+            params.append(before_id)
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT id, {', '.join(columns)} FROM {table} {where} ORDER BY timestamp DESC, id DESC LIMIT ?"
+
+        with closing(self._connect()) as connection:
+            items = [dict(row) for row in connection.execute(sql, (*params, limit + 1))]
+
+        more = len(items) > limit
+        items = items[:limit]
+        return {"items": items, "next_before_id": items[-1]["id"] if more else None}
+
+    def commands(self, **kwargs) -> dict:
+        return self.query("control_commands", **kwargs)
+
+    def alerts(self, **kwargs) -> dict:
+        return self.query("alerts", **kwargs)
+
+
+def iso_bound(value: Optional[datetime], sep: str = "T") -> Optional[str]:
+    """Formats a range bound like the stored timestamps."""
+    return value.isoformat(sep=sep) if value is not None else None
+
+
+event_log = EventLog()
+
+
+# --------------------------------------------------
+# Write throughput benchmark (simulated ingest load)
+# --------------------------------------------------
+if __name__ == "__main__":
+    import tempfile
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    THREADS, ROWS = 8, 25000
+
+    with tempfile.TemporaryDirectory() as directory:
+        log = EventLog(os.path.join(directory, "events.db"))
+        log.start()
+
+        def producer(worker):
+            for i in range(ROWS):
+                now = datetime.now()
+                if i % 10 == 0:
+                    log.log_command({"device": "pump", "zone": f"zone_{worker}", "command": "START",
+                                     "status": "SUCCESS", "timestamp": now.isoformat()})
+                else:
+                    log.log_alert({"device_id": f"SN-{worker:03d}", "flow_rate": 45.0, "water_level": 2.8,
+                                   "temperature": 23.5, "status": "Leak", "timestamp": now.isoformat(sep=" ")})
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(THREADS) as pool:
+            list(pool.map(producer, range(THREADS)))
+        queued = time.perf_counter() - started
+        log.flush()
+        committed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        page = log.alerts(device="SN-003", limit=100)
+        query_ms = (time.perf_counter() - started) * 1000
+        log.close()
+
+    total = THREADS * ROWS
+    print(f"{total} rows from {THREADS} threads: enqueued in {queued:.2f}s, "
+          f"committed in {committed:.2f}s ({total / committed:,.0f} rows/s); "
+          f"device page of {len(page['items'])} in {query_ms:.1f} ms")
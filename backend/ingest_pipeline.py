@@ -0,0 +1,233 @@
+# backend/ingest_pipeline.py
+
+# Staged ingest: validate -> enrich -> detect -> sinks (storage, alerts, events).
+#
+# Validation runs in the request handler; every later stage is a pool of
+# worker threads fed by a bounded queue. The request only waits until its
+# reading has been through detection, then answers; storage, alerting and
+# event publishing continue in the sink stages.
+#
+# Backpressure: when a sink is slow its queue fills, detect workers block on
+# it, the upstream queues fill in turn and new readings are refused at the
+# entrance (PipelineFull -> 503 with Retry-After) instead of piling up in
+# request threads.
+
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+
+# Sentinel telling a worker to exit
+_STOP = object()
+
+
+class PipelineFull(Exception):
+    """The entrance queue is full; the caller should retry later."""
+
+
+class Stage:
+    """
+    A bounded queue served by `workers` threads running `handler(item)`.
+    With `partition`, each worker owns its own queue and items with the same
+    key always go to the same worker, which keeps per-device order.
+    """
+
+    def __init__(self, name: str, handler: Callable, workers: int = 1, queue_size: int = 1000,
+                 partition: Optional[Callable] = None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.partition = partition
+        queues = self.workers if partition else 1
+        self.queues = [queue.Queue(maxsize=max(1, queue_size // queues)) for _ in range(queues)]
+        self.capacity = sum(q.maxsize for q in self.queues)
+        self.forward = None  # set by the pipeline: called with each handler result
+        self.on_error = None
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self.processed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.service_total = 0.0
+        self.service_max = 0.0
+        self.wait_total = 0.0
+
+    def _queue_for(self, item) -> queue.Queue:
+        if self.partition is None:
+            return self.queues[0]
+        key = self.partition(item).encode("utf-8")
+        return self.queues[zlib.crc32(key) % len(self.queues)]
+
+    def put(self, item, block: bool = True) -> None:
+        """Raises queue.Full when not blocking and the queue is full."""
+        self._queue_for(item).put((time.perf_counter(), item), block=block)
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            q = self.queues[i % len(self.queues)]
+            thread = threading.Thread(target=self._run, args=(q,), name=f"ingest-{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Lets the workers finish what is queued, then joins them."""
+        for i in range(len(self._threads)):
+            self.queues[i % len(self.queues)].put((0.0, _STOP))
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self, q: queue.Queue) -> None:
+        while True:
+            enqueued, item = q.get()
+            if item is _STOP:
+                return
+
+            started = time.perf_counter()
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            elapsed = time.perf_counter() - started
+
+            if error is None and self.forward is not None:
+                # Inside the try as well: an exception escaping here would
+                # end this worker thread and silently stop its queue
+                try:
+                    self.forward(result)
+                except Exception as e:
+                    error = e
+
+            with self._lock:
+                self.processed += 1
+                self.errors += error is not None
+                self.service_total += elapsed
+                self.service_max = max(self.service_max, elapsed)
+                self.wait_total += started - enqueued
+
+            if error is not None:
+                print(f"Ingest stage {self.name} failed:", error)
+                if self.on_error:
+                    try:
+                        self.on_error(item, error)
+                    except Exception as e:
+                        print(f"Ingest stage {self.name} error handler failed:", e)
+
+    def stats(self, uptime: float) -> dict:
+        with self._lock:
+            processed = self.processed
+            return {
+                "workers": self.workers,
+                "queued": sum(q.qsize() for q in self.queues),
+                "capacity": self.capacity,
+                "processed": processed,
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "per_second": round(processed / uptime, 2) if uptime > 0 else 0.0,
+                "avg_service_ms": round(1000 * self.service_total / processed, 3) if processed else 0.0,
+                "max_service_ms": round(1000 * self.service_max, 3),
+                "avg_wait_ms": round(1000 * self.wait_total / processed, 3) if processed else 0.0,
+            }
+
+
+class IngestPipeline:
+    """
+    enrich -> detect -> sinks. Items are dicts with at least "reading";
+    `submit` returns a Future resolved with the detect result.
+
+    sinks: {name: (handler, predicate or None, workers)}; an item is sent to a
+    sink only when its predicate accepts it (e.g. alerts for leaks only).
+    """
+
+    def __init__(self, enrich: Callable, detect: Callable, sinks: dict, workers: int = 4,
+                 queue_size: int = 1000, partition: Optional[Callable] = None):
+        self.enrich = Stage("enrich", enrich, workers, queue_size, partition=partition)
+        self.detect = Stage("detect", self._detect_and_resolve(detect), workers, queue_size, partition=partition)
+        self.sinks = {
+            name: (Stage(name, handler, sink_workers, queue_size), predicate)
+            for name, (handler, predicate, sink_workers) in sinks.items()
+        }
+        self.rejected = 0
+        self.started_at = None
+
+        self.enrich.forward = lambda item: self.detect.put(item)
+        self.detect.forward = self._to_sinks
+        self.enrich.on_error = self.detect.on_error = self._fail
+
+    @staticmethod
+    def _detect_and_resolve(detect: Callable) -> Callable:
+        def handler(item: dict) -> dict:
+            item = detect(item)
+            future = item.get("future")
+            if future is not None and not future.done():
+                future.set_result(item["result"])
+            return item
+        return handler
+
+    @staticmethod
+    def _fail(item: dict, error: Exception) -> None:
+        future = item.get("future")
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    def _to_sinks(self, item: dict) -> None:
+        # Blocking puts: a full sink stalls detection, which is the backpressure
+        for stage, predicate in self.sinks.values():
+            if predicate is None or predicate(item):
+                stage.put(item)
+
+    def stages(self) -> list:
+        return [self.enrich, self.detect] + [stage for stage, _ in self.sinks.values()]
+
+    def start(self) -> None:
+        if self.started_at is not None:
+            return
+        self.started_at = time.monotonic()
+        for stage in self.stages():
+            stage.start()
+
+    def stop(self) -> None:
+        """Drains every stage in order (upstream first)."""
+        if self.started_at is None:
+            return
+        for stage in self.stages():
+            stage.stop()
+        self.started_at = None
+
+    def submit(self, reading: dict) -> Future:
+        """Queues one validated reading; raises PipelineFull when saturated."""
+        future = Future()
+        try:
+            self.enrich.put({"reading": reading, "future": future}, block=False)
+        except queue.Full:
+            self.rejected += 1
+            raise PipelineFull()
+        return future
+
+    def send_to_sink(self, name: str, item: dict) -> bool:
+        """
+        Queues an item straight into one sink without blocking (callers are
+        request threads). Returns False and counts a drop when the sink is full.
+        """
+        stage = self.sinks[name][0]
+        try:
+            stage.put(item, block=False)
+        except queue.Full:
+            with stage._lock:
+                stage.dropped += 1
+            return False
+        return True
+
+    def stats(self) -> dict:
+        uptime = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "uptime_s": round(uptime, 1),
+            "rejected": self.rejected,
+            "stages": {stage.name: stage.stats(uptime) for stage in self.stages()},
+        }
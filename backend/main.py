@@ -1,8 +1,14 @@
 # Import FastAPI framework to create the web server and API endpoints
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
 
 # Import BaseModel and Field for strict validation
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
+
+import asyncio
+import json
 
 # Import datetime for timestamp handling
 from datetime import datetime
@@ -15,16 +21,168 @@ try:
 except ImportError:
     from alert_service import send_discord_alert
 
-from control_service import control_pump, control_valve, get_history
+try:
+    from backend.auth import JWT_SECRET, create_token, device_keys, token_cache, verify_admin_key, verify_api_key
+except ImportError:
+    from auth import JWT_SECRET, create_token, device_keys, token_cache, verify_admin_key, verify_api_key
+
+try:
+    from backend.middleware import DEFAULT_QUOTAS, check_rate, client_identity, limiter, rate_limit
+except ImportError:
+    from middleware import DEFAULT_QUOTAS, check_rate, client_identity, limiter, rate_limit
+
+try:
+    from backend.profiler import ProfilerMiddleware, profiler, router as profiler_router
+except ImportError:
+    from profiler import ProfilerMiddleware, profiler, router as profiler_router
+
+try:
+    from backend.streaming import NDJSONStreamingResponse, decode_record, iter_ndjson, pipelined
+except ImportError:
+    from streaming import NDJSONStreamingResponse, decode_record, iter_ndjson, pipelined
+
+try:
+    from backend import payload_formats
+except ImportError:
+    import payload_formats
+
+try:
+    from backend.device_stats import DeviceStats
+except ImportError:
+    from device_stats import DeviceStats
+
+try:
+    from backend.timeseries_store import RESOLUTIONS, METRICS, TimeSeriesStore, to_seconds
+except ImportError:
+    from timeseries_store import RESOLUTIONS, METRICS, TimeSeriesStore, to_seconds
+
+try:
+    from backend.event_bus import event_bus
+except ImportError:
+    from event_bus import event_bus
+
+try:
+    from backend.device_registry import Device, DeviceRegistry
+except ImportError:
+    from device_registry import Device, DeviceRegistry
+
+try:
+    from backend.analytics import PERIODS, flow_trends
+except ImportError:
+    from analytics import PERIODS, flow_trends
+
+try:
+    from backend.network_balance import NETWORK_FILE, MassBalanceEngine, NetworkModel, meter_matrix
+except ImportError:
+    from network_balance import NETWORK_FILE, MassBalanceEngine, NetworkModel, meter_matrix
+
+import numpy as np
+import os
+from pathlib import Path
+
+try:
+    from backend.event_log import event_log, iso_bound
+except ImportError:
+    from event_log import event_log, iso_bound
+
+try:
+    from backend.ingest_pipeline import IngestPipeline, PipelineFull
+except ImportError:
+    from ingest_pipeline import IngestPipeline, PipelineFull
+
+try:
+    from backend.pump_scheduler import Pump, Tank, ZoneDemand, schedule_from_forecast
+except ImportError:
+    from pump_scheduler import Pump, Tank, ZoneDemand, schedule_from_forecast
+
+from control_service import DEFAULT_ZONE, control_pump, control_valve, device_states, get_history
 from decision_engine import SensorData as DecisionSensorData, make_irrigation_decision
 
 # Threshold used to detect abnormal flow rate
 LEAK_FLOW_RATE_THRESHOLD = 40.0
 
+# Ingest pipeline sizing (worker threads per stage, queued readings per stage)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_ALERT_WORKERS = int(os.getenv("INGEST_ALERT_WORKERS", "4"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "1000"))
+STREAM_RETRY_DELAY = 0.05
+
+# Per-device flow baselines, persisted between restarts
+DEVICE_STATS_PATH = os.getenv(
+    "DEVICE_STATS_PATH",
+    str(Path(__file__).resolve().parent.parent / "data" / "state" / "device_stats.npz")
+)
+device_stats = DeviceStats()
+
+# Recent raw readings and minute/hour/day rollups, updated on ingest
+timeseries = TimeSeriesStore()
+
+# Device locations and zones (data/devices.json)
+device_registry = DeviceRegistry()
+
+# Metered pipe network for mass-balance leak localization (data/network.json)
+balance_engine = None
+
 
 # Create FastAPI application instance
 app = FastAPI()
 
+# On-demand sampling profiler (admin only, idle unless started)
+app.add_middleware(ProfilerMiddleware, profiler=profiler)
+app.include_router(profiler_router)
+
+
+@app.on_event("startup")
+def load_device_registry():
+    loaded = device_registry.load_json()
+    print(f"Loaded {loaded} devices in {len(device_registry.zone_names())} zones")
+
+
+@app.on_event("startup")
+def load_network():
+    global balance_engine
+    if not os.path.isfile(NETWORK_FILE):
+        print("No network model found, mass-balance localization disabled")
+        return
+    network = NetworkModel.from_json(NETWORK_FILE)
+    balance_engine = MassBalanceEngine(network)
+    print(f"Loaded network with {len(network.nodes)} nodes and {len(network.pipes)} pipes")
+
+
+@app.on_event("startup")
+def load_device_keys():
+    loaded = device_keys.load()
+    print(f"Loaded {loaded} device keys")
+
+
+@app.on_event("startup")
+def load_rate_limits():
+    loaded = limiter.load_json()
+    print(f"Loaded {loaded} per-device rate limits")
+
+
+@app.on_event("startup")
+def restore_device_stats():
+    restored = device_stats.restore(DEVICE_STATS_PATH)
+    print(f"Restored baselines for {restored} devices")
+
+
+@app.on_event("shutdown")
+def save_device_stats():
+    saved = device_stats.snapshot(DEVICE_STATS_PATH)
+    print(f"Saved baselines for {saved} devices to {DEVICE_STATS_PATH}")
+
+
+@app.on_event("startup")
+def open_event_log():
+    event_log.start()
+
+
+@app.on_event("shutdown")
+def close_event_log():
+    event_log.close()
+    print(f"Event log closed ({event_log.written} rows written)")
+
 
 # ===============================
 # Data Model (Strict Validation)
@@ -57,38 +215,532 @@ def health_check():
     return {"status": "Server running"}
 
 
+# ===============================
+# Leak Logic (shared by all ingest paths)
+# ===============================
+def send_leak_alert(reading: dict) -> bool:
+    """Sends the leak alert for one reading; never raises."""
+    alert_payload = {
+        "device_id": reading["device_id"],
+        "flow_rate": reading["flow_rate"],
+        "water_level": reading["water_level"],
+        "temperature": reading["temperature"],
+        "status": "Leak",
+        "timestamp": (reading.get("timestamp") or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+    # Durable record first: the webhook may fail or be unconfigured
+    event_log.log_alert(alert_payload)
+
+    try:
+        return send_discord_alert(alert_payload)
+    except Exception as e:
+        print("Error sending alert:", e)
+        return False
+
+
+# Stages of the ingest pipeline (validation happens in the endpoints)
+def enrich_reading(item: dict) -> dict:
+    """Updates the device baseline and attaches it, with the device zone."""
+    reading = item["reading"]
+    item["baseline"] = device_stats.update(reading["device_id"], reading["flow_rate"], reading["timestamp"])
+    device = device_registry.get(reading["device_id"])
+    item["zone"] = device.zone if device else None
+    return item
+
+
+def detect_leak(item: dict) -> dict:
+    """
+    A leak is reported when the device says so, when the flow exceeds the
+    global threshold, or when it is abnormally high for this device's baseline.
+    """
+    reading, baseline = item["reading"], item["baseline"]
+    leak_by_status = (reading.get("status") or "").strip().lower() == "leak"
+    leak_by_flow = reading["flow_rate"] >= LEAK_FLOW_RATE_THRESHOLD
+    leak_by_baseline = baseline["anomaly"]
+    item["leak_detected"] = leak_by_status or leak_by_flow or leak_by_baseline
+
+    item["result"] = {
+        "leak_detected": item["leak_detected"],
+        "alert_queued": item["leak_detected"],
+        "baseline": baseline,
+    }
+    return item
+
+
+def store_reading(item: dict) -> None:
+    reading = item["reading"]
+    timeseries.add(reading["device_id"], reading["timestamp"], reading["flow_rate"],
+                   reading["water_level"], reading["temperature"])
+
+
+def alert_reading(item: dict) -> None:
+    # Blocking network and CSV I/O, isolated in its own worker pool
+    alert_sent = send_leak_alert(item["reading"])
+    event_bus.publish("alert", {**item["reading"], "alert_sent": alert_sent})
+
+
+def publish_reading(item: dict) -> None:
+    event_bus.publish("reading", {**item["reading"], "leak_detected": item["leak_detected"]})
+
+
+ingest_pipeline = IngestPipeline(
+    enrich=enrich_reading,
+    detect=detect_leak,
+    sinks={
+        "storage": (store_reading, None, 1),
+        "alerts": (alert_reading, lambda item: item["leak_detected"], INGEST_ALERT_WORKERS),
+        "events": (publish_reading, None, 1),
+    },
+    workers=INGEST_WORKERS,
+    queue_size=INGEST_QUEUE_SIZE,
+    partition=lambda item: item["reading"]["device_id"],
+)
+
+
+@app.on_event("startup")
+def start_ingest_pipeline():
+    ingest_pipeline.start()
+
+
+@app.on_event("shutdown")
+def stop_ingest_pipeline():
+    ingest_pipeline.stop()
+
+
+async def submit_reading(data: SensorData) -> dict:
+    """Queues a validated reading and waits until leak detection is done."""
+    future = ingest_pipeline.submit(data.dict())
+    return await asyncio.wrap_future(future)
+
+
+def process_batch(batch) -> dict:
+    """
+    Vectorized counterpart of the ingest pipeline for a SensorBatch.
+    Only the rows flagged as leaks are turned into Python dicts and queued
+    to the alert sink; when that sink is full the alert is dropped (counted
+    in /metrics/pipeline) rather than blocking the request thread.
+    """
+    valid, rejected = payload_formats.validate_batch(batch)
+    accepted = batch.take(valid)
+    accepted_index = valid.nonzero()[0]
+
+    _, baseline_anomaly = device_stats.update_many(
+        accepted.device_id, accepted.flow_rate, accepted.timestamp
+    )
+    timeseries.add_many(
+        accepted.device_id,
+        accepted.timestamp,
+        np.column_stack([accepted.flow_rate, accepted.water_level, accepted.temperature]),
+    )
+    leak_mask = payload_formats.detect_leaks(accepted, LEAK_FLOW_RATE_THRESHOLD) | baseline_anomaly
+
+    leaks = []
+    for i in leak_mask.nonzero()[0]:
+        reading = accepted.record(i)
+        queued = ingest_pipeline.send_to_sink("alerts", {"reading": reading, "leak_detected": True})
+        leaks.append({
+            "index": int(accepted_index[i]),
+            "device_id": reading["device_id"],
+            "alert_queued": queued,
+        })
+
+    # One summary event per batch rather than one per reading
+    if len(accepted):
+        event_bus.publish("readings", {
+            "count": len(accepted),
+            "devices": sorted(set(accepted.device_id.tolist())),
+            "leaks": len(leaks),
+        })
+
+    return {
+        "message": "Batch received",
+        "received": len(batch),
+        "accepted": len(accepted),
+        "rejected": rejected,
+        "leaks": leaks,
+    }
+
+
 # ===============================
 # Data Ingestion Endpoint
 # ===============================
-@app.post("/ingest")
-def ingest(data: SensorData):
-    print(data)
-
-    leak_by_status = (data.status or "").strip().lower() == "leak"
-    leak_by_flow = data.flow_rate >= LEAK_FLOW_RATE_THRESHOLD
-    leak_detected = leak_by_status or leak_by_flow
-    alert_sent = False
-
-    if leak_detected:
-        alert_payload = {
-            "device_id": data.device_id,
-            "flow_rate": data.flow_rate,
-            "water_level": data.water_level,
-            "temperature": data.temperature,
-            "status": "Leak",
-            "timestamp": (data.timestamp or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
-        }
+def _parse_single_reading(body: bytes, content_type: str) -> SensorData:
+    """Decodes a JSON, MessagePack or single-row Arrow body into SensorData."""
+    if payload_formats.media_type(content_type) in payload_formats.ARROW_TYPES:
+        batch = payload_formats.decode_arrow(body)
+        if len(batch) != 1:
+            raise HTTPException(status_code=400, detail="Use /ingest/batch for multi-row Arrow bodies")
+        record = batch.record(0)
+    else:
+        record = payload_formats.decode_body(body, content_type)
+
+    if not isinstance(record, dict):
+        raise HTTPException(status_code=400, detail="Body must be a single SensorData object")
+
+    try:
+        return SensorData(**record)
+    except ValidationError as error:
+        raise RequestValidationError(error.errors())
+
+
+@app.post(
+    "/ingest",
+    openapi_extra={"requestBody": {"content": {
+        "application/json": {"schema": SensorData.schema()},
+        "application/msgpack": {"schema": SensorData.schema()},
+        "application/vnd.apache.arrow.stream": {},
+    }, "required": True}},
+)
+async def ingest(request: Request, _: str = Depends(rate_limit("ingest"))):
+    """
+    Ingests one reading sent as JSON (default), MessagePack or a one-row Arrow stream.
+    The response is MessagePack if the Accept header asks for it.
+    """
+    data = _parse_single_reading(await request.body(), request.headers.get("content-type"))
+
+    try:
+        result = await submit_reading(data)
+    except PipelineFull:
+        raise HTTPException(status_code=503, detail="Ingest pipeline is saturated",
+                            headers={"Retry-After": "1"})
+
+    return payload_formats.encode_response({
+        "message": "Data received",
+        **result
+    }, request.headers.get("accept"))
+
+
+@app.post("/ingest/batch")
+async def ingest_batch(request: Request):
+    """
+    Ingests many readings in one body: JSON or MessagePack (list of records
+    or dict of columns) or an Arrow IPC stream. Decoded into NumPy columns,
+    validated and checked for leaks without per-record objects.
+    Takes one ingest token per reading, like the streaming endpoints.
+    """
+    batch = payload_formats.decode_batch(await request.body(), request.headers.get("content-type"))
+    check_rate("ingest", client_identity(request), cost=max(1, len(batch)))
+
+    result = await run_in_threadpool(process_batch, batch)
+
+    return payload_formats.encode_response(result, request.headers.get("accept"))
+
+
+# ===============================
+# Streaming Ingestion Endpoints
+# ===============================
+def _stream_handler(identity: str):
+    """
+    Builds the per-connection record handler. Each acknowledgement carries
+    a sequence number so gateways can match it to the record they sent.
+    Every record takes an ingest token of the connection's device.
+    """
+    seq = 0
+
+    async def handle(record) -> dict:
+        nonlocal seq
+        seq += 1
 
+        retry_after = limiter.acquire("ingest", identity)
+        if retry_after:
+            return {"seq": seq, "status": "throttled", "retry_after": round(retry_after, 3)}
+
+        if isinstance(record, Exception):
+            return {"seq": seq, "status": "error", "detail": str(record)}
+        if not isinstance(record, dict):
+            return {"seq": seq, "status": "error", "detail": "Record must be a JSON object"}
+
+        try:
+            data = SensorData(**record)
+        except ValidationError as error:
+            return {"seq": seq, "status": "rejected", "detail": json.loads(error.json())}
+
+        # A saturated pipeline slows this connection down instead of failing it
+        while True:
+            try:
+                result = await submit_reading(data)
+                break
+            except PipelineFull:
+                await asyncio.sleep(STREAM_RETRY_DELAY)
+
+        return {"seq": seq, "status": "ok", "device_id": data.device_id, **result}
+
+    return handle
+
+
+@app.post("/ingest/stream")
+async def ingest_stream(request: Request):
+    """
+    Chunked NDJSON ingestion: one SensorData object per line.
+    Acknowledgements are streamed back as NDJSON while the upload continues.
+    """
+    handler = _stream_handler(client_identity(request))
+
+    async def acks():
+        async for ack in pipelined(iter_ndjson(request.stream()), handler):
+            yield json.dumps(ack) + "\n"
+
+    return NDJSONStreamingResponse(acks())
+
+
+@app.websocket("/ingest/ws")
+async def ingest_websocket(websocket: WebSocket):
+    """
+    Persistent ingestion link: one SensorData JSON object per message,
+    one acknowledgement message back per record.
+    """
+    try:
+        handler = _stream_handler(client_identity(websocket))
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    async def messages():
         try:
-            alert_sent = send_discord_alert(alert_payload)
-        except Exception as e:
-            print("Error sending alert:", e)
-            alert_sent = False
+            while True:
+                yield decode_record(await websocket.receive_text())
+        except WebSocketDisconnect:
+            return
+
+    try:
+        async for ack in pipelined(messages(), handler):
+            await websocket.send_json(ack)
+    except (WebSocketDisconnect, RuntimeError):
+        # Gateway went away while acknowledgements were still pending
+        return
+
+
+# ===============================
+# Device Registry
+# ===============================
+class DeviceInfo(BaseModel):
+    device_id: str = Field(..., min_length=1)
+    zone: str = Field(..., min_length=1)
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+    type: str = "flow_sensor"
+
+
+@app.get("/zones")
+def list_zones():
+    return [
+        {"zone": zone, "devices": len(device_registry.zones[zone])}
+        for zone in device_registry.zone_names()
+    ]
+
+
+@app.get("/devices")
+def list_devices(zone: Optional[str] = None):
+    """All registered devices, or those of one zone."""
+    devices = device_registry.in_zone(zone) if zone and zone != "All" else device_registry.all()
+    return [device.__dict__ for device in devices]
+
+
+@app.post("/devices")
+def register_device(data: DeviceInfo, _: str = Depends(verify_admin_key)):
+    device_registry.register(Device(**data.dict()))
+    # Persisted like device keys, so registrations survive a restart
+    device_registry.save_json()
+    return data
+
+
+@app.get("/devices/bbox")
+def devices_in_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    """Devices inside a map viewport."""
+    return [device.__dict__ for device in device_registry.bbox(min_lat, min_lon, max_lat, max_lon)]
+
+
+# Upper bound on k for /devices/nearest
+MAX_NEAREST = 1000
+
+
+@app.get("/devices/nearest")
+def nearest_devices(lat: float, lon: float, k: int = Query(5, ge=1, le=MAX_NEAREST),
+                    max_distance_m: Optional[float] = None):
+    """The k devices closest to a point, with their distance in metres."""
+    return [
+        {**device.__dict__, "distance_m": round(distance, 1)}
+        for distance, device in device_registry.nearest(lat, lon, k, max_distance_m)
+    ]
+
+
+@app.get("/devices/{device_id}")
+def get_device(device_id: str):
+    device = device_registry.get(device_id)
+    if device is None:
+        raise HTTPException(status_code=404, detail="Unknown device")
+    return device.__dict__
+
+
+@app.get("/devices/{device_id}/baseline")
+def device_baseline(device_id: str):
+    """Returns the learned flow baseline of a device."""
+    stats = device_stats.get(device_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Unknown device")
+    return stats
+
+
+# ===============================
+# Pipeline Metrics
+# ===============================
+@app.get("/metrics/pipeline")
+def pipeline_metrics():
+    """Per-stage queue depth, throughput, service time and queue wait of the ingest pipeline."""
+    return ingest_pipeline.stats()
+
+
+# ===============================
+# Live Updates
+# ===============================
+@app.get("/events")
+async def events(last_event_id: Optional[int] = Header(None)):
+    """
+    Server-sent events: `reading`, `readings` (batch summary) and `alert`.
+    Clients reconnecting with Last-Event-ID receive the events they missed.
+    """
+    return StreamingResponse(
+        event_bus.sse(last_event_id or 0),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/events/version")
+def events_version():
+    """Sequence number of the latest event; cheap to poll."""
+    return {"version": event_bus.version}
+
+
+# ===============================
+# Time-Series Queries
+# ===============================
+@app.get("/timeseries/devices")
+def timeseries_devices():
+    return timeseries.devices()
+
+
+@app.get("/timeseries/{device_id}/raw")
+def timeseries_raw(device_id: str, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None, limit: Optional[int] = Query(None, ge=1)):
+    """Recent raw readings of a device (bounded by the ring buffer size)."""
+    return timeseries.query_raw(device_id, start, end, limit)
+
+
+@app.get("/timeseries/{device_id}/rollup")
+def timeseries_rollup(device_id: str, resolution: str = "hour", metric: str = "flow_rate",
+                      start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Precomputed count/sum/mean/min/max/last per minute, hour or day bucket."""
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {list(RESOLUTIONS)}")
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {METRICS}")
+    return timeseries.query_rollup(device_id, resolution, metric, start, end)
+
+
+# ===============================
+# Analytics
+# ===============================
+@app.get("/analytics/trends")
+def analytics_trends(period: str = "daily", zone: Optional[str] = None):
+    """
+    Flow totals and averages per day, week or month for one zone (device)
+    or all of them, computed from the precomputed day rollups.
+    """
+    period = period.lower()
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {list(PERIODS)}")
+
+    if not zone or zone == "All":
+        devices = timeseries.devices()
+    elif zone in device_registry.zones:
+        devices = [d.device_id for d in device_registry.in_zone(zone)]
+    else:
+        # Dashboards without a registry use device IDs as zones
+        devices = [zone]
 
     return {
-        "message": "Data received",
-        "alert_sent": alert_sent,
-        "leak_detected": leak_detected
+        "period": period,
+        "zone": zone or "All",
+        # In-memory store: every reading ingested since the backend started
+        "source": "timeseries_store",
+        "series": flow_trends(timeseries, devices, period),
+    }
+
+
+# ===============================
+# Device Authentication
+# ===============================
+@app.post("/auth/token")
+def issue_token(device_id: str = Depends(verify_api_key)):
+    """Exchanges a device key for a short-lived JWT (`Authorization: Bearer <token>`)."""
+    if not JWT_SECRET:
+        raise HTTPException(status_code=503, detail="JWT_SECRET is not configured")
+    return {"access_token": create_token(device_id), "token_type": "bearer", "device_id": device_id}
+
+
+@app.post("/admin/device-keys/{device_id}")
+def issue_device_key(device_id: str, _: str = Depends(verify_admin_key)):
+    """Creates (or rotates) the key of a device. The key is only shown in this response."""
+    api_key = device_keys.issue(device_id)
+    device_keys.save()
+    return {"device_id": device_id, "api_key": api_key}
+
+
+@app.get("/admin/device-keys")
+def device_key_stats(_: str = Depends(verify_admin_key)):
+    return {"keys": len(device_keys.devices), "token_cache": token_cache.stats()}
+
+
+# ===============================
+# Admission Control
+# ===============================
+class RateLimitQuota(BaseModel):
+    rate: float = Field(..., gt=0)
+    burst: float = Field(..., ge=1)
+
+
+@app.get("/admin/rate-limits")
+def rate_limit_stats(_: str = Depends(verify_admin_key)):
+    """Admitted and throttled request counters, most throttled identities and per-device quotas."""
+    return limiter.stats()
+
+
+@app.put("/admin/rate-limits/{scope}/{device_id}")
+def set_rate_limit(scope: str, device_id: str, quota: RateLimitQuota, _: str = Depends(verify_admin_key)):
+    if scope not in DEFAULT_QUOTAS:
+        raise HTTPException(status_code=404, detail="Unknown scope")
+    limiter.set_quota(scope, device_id, quota.rate, quota.burst)
+    return {"scope": scope, "device_id": device_id, **quota.dict()}
+
+
+# ===============================
+# Network Mass Balance
+# ===============================
+@app.get("/network/leaks")
+def network_leaks(window_minutes: int = 60, top: int = Query(10, ge=1), end: Optional[datetime] = None):
+    """
+    Ranks network nodes by unaccounted water over the last window,
+    using per-minute mean flows of the pipe and consumption meters.
+    """
+    if balance_engine is None:
+        raise HTTPException(status_code=404, detail="No network model loaded")
+    if not 1 <= window_minutes <= RESOLUTIONS["minute"][1]:
+        raise HTTPException(status_code=400, detail="window_minutes out of range")
+
+    end_s = to_seconds(end)
+    start_s = end_s - window_minutes * 60
+    network = balance_engine.network
+
+    flows = meter_matrix(timeseries, network.pipe_meters, start_s, end_s)
+    consumption = meter_matrix(timeseries, network.consumption_meters, start_s, end_s)
+
+    return {
+        "window_minutes": window_minutes,
+        "nodes": len(network.nodes),
+        "candidates": balance_engine.rank(flows, consumption, top=top),
     }
 
 
@@ -97,13 +749,22 @@ def ingest(data: SensorData):
 # ===============================
 
 class PumpCommand(BaseModel):
-    """Schema for pump requests; expects a JSON object like {"command": "START"}"""
+    """Schema for pump requests; expects a JSON object like {"command": "START", "zone": "Zone_A"}"""
     command: str
+    zone: str = DEFAULT_ZONE
 
 
 class ValveCommand(BaseModel):
-    """Schema for valve requests; expects a JSON object like {"command": "OPEN"}"""
+    """Schema for valve requests; expects a JSON object like {"command": "OPEN", "zone": "Zone_A"}"""
+    command: str
+    zone: str = DEFAULT_ZONE
+
+
+class DeviceCommand(BaseModel):
+    """One command of a bulk request, e.g. {"device": "pump", "command": "START", "zone": "Zone_A"}"""
+    device: str
     command: str
+    zone: str = DEFAULT_ZONE
 
 class IrrigationInput(BaseModel):
     soil_moisture: float
@@ -112,35 +773,101 @@ class IrrigationInput(BaseModel):
     rainfall_forecast: float
     crop_type: str
 
+class ForecastPoint(BaseModel):
+    """One row of forecast_for_or output"""
+    Timestamp: datetime
+    Predicted_Depth: float
+
+
+class PumpSpec(BaseModel):
+    name: str
+    capacity: float = Field(..., gt=0)
+    efficiency: float = Field(0.7, gt=0, le=1)
+    static_head: float = 0.0
+
+
+class ZoneDemandSpec(BaseModel):
+    zone: str
+    demand: float = Field(..., ge=0)
+    max_flow: float = Field(..., gt=0)
+
+
+class TankSpec(BaseModel):
+    capacity: float = Field(..., ge=0)
+    initial: float = Field(0.0, ge=0)
+    final_min: Optional[float] = None
+
+
+class TariffPeriod(BaseModel):
+    start_hour: int = Field(..., ge=0, le=24)
+    end_hour: int = Field(..., ge=0, le=24)
+    price: float = Field(..., ge=0)
+
+
+class ScheduleRequest(BaseModel):
+    forecast: list[ForecastPoint]
+    pumps: list[PumpSpec]
+    zones: list[ZoneDemandSpec]
+    tank: TankSpec
+    tariffs: Optional[list[TariffPeriod]] = None
+
 @app.post("/control/pump")
-def pump_control(data: PumpCommand):
+def pump_control(data: PumpCommand, _: str = Depends(rate_limit("control"))):
     """
     POST Endpoint: Receives a command for the pump.
     Passes the 'command' string to the control_pump logic function.
     """
-    return control_pump(data.command)
+    return control_pump(data.command, data.zone)
 
 
 @app.post("/control/valve")
-def valve_control(data: ValveCommand):
+def valve_control(data: ValveCommand, _: str = Depends(rate_limit("control"))):
     """
     POST Endpoint: Receives a command for the valve.
     Passes the 'command' string to the control_valve logic function.
     """
-    return control_valve(data.command)
+    return control_valve(data.command, data.zone)
+
+
+@app.post("/control/bulk")
+def bulk_control(commands: list[DeviceCommand], request: Request):
+    """
+    Applies several pump/valve commands as one batch, in order.
+    Each command gets its own SUCCESS/FAILED log entry and takes one control token.
+    """
+    check_rate("control", client_identity(request), cost=max(1, len(commands)))
+    return device_states.apply_many([(c.device, c.command, c.zone) for c in commands])
+
+
+@app.get("/control/state")
+def control_state():
+    """Current state of every pump and valve that has received a command."""
+    return device_states.snapshot()
 
 
 @app.get("/control/history")
-def history():
+def history(device: Optional[str] = None, zone: Optional[str] = None,
+            start: Optional[datetime] = None, end: Optional[datetime] = None,
+            limit: int = 100, before_id: Optional[int] = None):
     """
-    GET Endpoint: Returns the full JSON history of all commands executed.
+    GET Endpoint: Returns the logged commands, newest first, one page at a time.
+    Pass `next_before_id` from the response as `before_id` to get older commands.
     Useful for monitoring the system state from a web browser or dashboard.
     """
-    return get_history()
+    return get_history(device=device, zone=zone, start=iso_bound(start), end=iso_bound(end),
+                       limit=limit, before_id=before_id)
+
+
+@app.get("/alerts")
+def alerts(device_id: Optional[str] = None, start: Optional[datetime] = None,
+           end: Optional[datetime] = None, limit: int = 100, before_id: Optional[int] = None):
+    """Logged leak alerts, newest first, paginated like /control/history."""
+    return event_log.alerts(device=device_id, start=iso_bound(start, sep=" "), end=iso_bound(end, sep=" "),
+                            limit=limit, before_id=before_id)
 
 
 @app.post("/smart-irrigation")
-def smart_irrigation(data: IrrigationInput):
+def smart_irrigation(data: IrrigationInput, _: str = Depends(rate_limit("control"))):
     """
     Intelligent irrigation endpoint.
     Uses rule engine to decide action,
@@ -162,3 +889,25 @@ def smart_irrigation(data: IrrigationInput):
         control_valve("CLOSE")
 
     return decision
+
+
+@app.post("/smart-irrigation/schedule")
+def irrigation_schedule(data: ScheduleRequest):
+    """
+    Cheapest pump / valve schedule over the forecast horizon.
+    Takes the forecast_for_or output, pump capacities, zone demands,
+    the storage tank and the tariff periods; nothing is actuated.
+    """
+    if not data.forecast or not data.pumps:
+        raise HTTPException(status_code=400, detail="forecast and pumps are required")
+
+    try:
+        return schedule_from_forecast(
+            [point.dict() for point in data.forecast],
+            pumps=[Pump(**pump.dict()) for pump in data.pumps],
+            zones=[ZoneDemand(**zone.dict()) for zone in data.zones],
+            tank=Tank(**data.tank.dict()),
+            tariffs=[period.dict() for period in data.tariffs] if data.tariffs else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
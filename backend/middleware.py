@@ -1,4 +1,176 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+# backend/middleware.py
 
-limiter = Limiter(key_func=get_remote_address)
+# Per-device token-bucket admission control for ingest and control routes.
+#
+# Each (scope, identity) pair owns a bucket of `burst` tokens refilled at
+# `rate` tokens per second; a request takes one token per reading or
+# command it carries (one for single-reading routes) or gets a 429 with
+# Retry-After. Identity is the authenticated device id; requests without
+# device credentials share per-address "anonymous" buckets with a lower
+# quota, so one misbehaving gateway only exhausts its own budget. Callers
+# using the legacy shared key get one bucket per address as well: their
+# X-Device-ID header is client-controlled and could mint fresh buckets.
+#
+# A check is a dict lookup plus a few float operations under a lock.
+
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+
+try:
+    from backend.auth import SHARED_KEY_DEVICE, device_identity
+except ImportError:
+    from auth import SHARED_KEY_DEVICE, device_identity
+
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RATE_LIMITS_FILE = os.getenv("RATE_LIMITS_FILE", str(ROOT_DIR / "data" / "rate_limits.json"))
+
+# Buckets kept in memory; the least recently used identities are dropped first
+MAX_BUCKETS = 100_000
+
+
+@dataclass
+class Quota:
+    rate: float   # tokens per second
+    burst: float  # bucket size
+
+
+# Default quotas per scope, for authenticated devices and anonymous clients
+DEFAULT_QUOTAS = {
+    "ingest": Quota(rate=50.0, burst=100.0),
+    "control": Quota(rate=5.0, burst=10.0),
+}
+ANONYMOUS_QUOTAS = {
+    "ingest": Quota(rate=10.0, burst=20.0),
+    "control": Quota(rate=1.0, burst=5.0),
+}
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets keyed by (scope, identity) with per-device quota overrides.
+    """
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()  # (scope, identity) -> [tokens, last refill]
+        self.overrides = {}           # (scope, device_id) -> Quota
+        self.allowed = {}             # scope -> count
+        self.throttled = {}           # scope -> count
+        self.throttled_by = {}        # (scope, identity) -> count
+        self._lock = threading.Lock()
+
+    def quota(self, scope: str, identity: str) -> Quota:
+        if identity.startswith("anonymous:"):
+            return ANONYMOUS_QUOTAS[scope]
+        return self.overrides.get((scope, identity), DEFAULT_QUOTAS[scope])
+
+    def set_quota(self, scope: str, device_id: str, rate: float, burst: float) -> None:
+        # A zero rate would never refill: the wait (and Retry-After) would be infinite
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"Invalid quota for {scope}/{device_id}: rate must be > 0 and burst >= 1")
+        with self._lock:
+            self.overrides[(scope, device_id)] = Quota(rate=rate, burst=burst)
+            self.buckets.pop((scope, device_id), None)
+
+    def acquire(self, scope: str, identity: str, cost: float = 1.0) -> float:
+        """
+        Takes `cost` tokens. Returns 0 when admitted, otherwise the number
+        of seconds until enough tokens will be available. A cost above the
+        burst is admitted with a full bucket and leaves it in debt, so large
+        batches are possible but still paid for at the quota rate.
+        """
+        quota = self.quota(scope, identity)
+        key = (scope, identity)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [quota.burst, now]
+                if len(self.buckets) > self.max_buckets:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(quota.burst, bucket[0] + (now - bucket[1]) * quota.rate)
+                bucket[1] = now
+
+            needed = min(cost, quota.burst)
+            if bucket[0] >= needed:
+                bucket[0] -= cost
+                self.allowed[scope] = self.allowed.get(scope, 0) + 1
+                return 0.0
+
+            self.throttled[scope] = self.throttled.get(scope, 0) + 1
+            if key in self.throttled_by or len(self.throttled_by) < self.max_buckets:
+                self.throttled_by[key] = self.throttled_by.get(key, 0) + 1
+            return (needed - bucket[0]) / quota.rate
+
+    def stats(self, top: int = 10) -> dict:
+        with self._lock:
+            worst = sorted(self.throttled_by.items(), key=lambda item: item[1], reverse=True)[:top]
+            return {
+                "allowed": dict(self.allowed),
+                "throttled": dict(self.throttled),
+                "buckets": len(self.buckets),
+                "top_throttled": [
+                    {"scope": scope, "identity": identity, "throttled": count}
+                    for (scope, identity), count in worst
+                ],
+                "quotas": [
+                    {"scope": scope, "device_id": device_id, "rate": q.rate, "burst": q.burst}
+                    for (scope, device_id), q in sorted(self.overrides.items())
+                ],
+            }
+
+    def load_json(self, path: str = RATE_LIMITS_FILE) -> int:
+        """Loads {"scope": {"device_id": {"rate": .., "burst": ..}}} overrides."""
+        if not os.path.isfile(path):
+            return 0
+        with open(path, encoding="utf-8") as file_handle:
+            for scope, devices in json.load(file_handle).items():
+                for device_id, quota in devices.items():
+                    self.set_quota(scope, device_id, float(quota["rate"]), float(quota["burst"]))
+        return len(self.overrides)
+
+
+limiter = TokenBucketLimiter()
+
+
+def client_identity(request) -> str:
+    """Authenticated device id, or a per-address identity (shared key or anonymous)."""
+    device_id = device_identity(request.headers)
+    host = request.client.host if request.client else "unknown"
+    if device_id == SHARED_KEY_DEVICE:
+        return f"{SHARED_KEY_DEVICE}:{host}"
+    if device_id is not None:
+        return device_id
+    return f"anonymous:{host}"
+
+
+def check_rate(scope: str, identity: str, cost: float = 1.0) -> None:
+    retry_after = limiter.acquire(scope, identity, cost)
+    if retry_after:
+        seconds = max(1, math.ceil(retry_after))
+        raise HTTPException(
+            status_code=429,
+            detail={"message": "Rate limit exceeded", "scope": scope, "retry_after": round(retry_after, 3)},
+            headers={"Retry-After": str(seconds)},
+        )
+
+
+def rate_limit(scope: str):
+    """FastAPI dependency admitting one request of `scope` per token."""
+    def dependency(request: Request) -> str:
+        identity = client_identity(request)
+        check_rate(scope, identity)
+        return identity
+    return dependency
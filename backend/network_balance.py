@@ -0,0 +1,182 @@
+# backend/network_balance.py
+
+# Mass-balance leak localization for a metered distribution network.
+#
+# The network is a directed graph: nodes are district metered areas
+# (or junctions), pipes carry a flow meter and go from one node to another.
+# With the sparse incidence matrix A (nodes x pipes, +1 where a pipe enters
+# a node, -1 where it leaves), the water unaccounted for in every node over
+# every time step is
+#
+#     R = A @ Q - C
+#
+# where Q (pipes x T) are the metered pipe flows and C (nodes x T) the
+# metered consumption inside each node. All nodes and time steps are
+# computed in one sparse product; nodes whose residual is large and
+# persistent are ranked as the likely leak locations.
+
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+NETWORK_FILE = os.getenv("NETWORK_FILE", str(ROOT_DIR / "data" / "network.json"))
+
+# Node kinds whose inflow/outflow is not metered (no balance is computed)
+BOUNDARY_KINDS = {"source", "sink"}
+
+
+@dataclass
+class Pipe:
+    pipe_id: str
+    from_node: str
+    to_node: str
+    meter: Optional[str] = None  # device_id measuring the pipe flow
+
+
+@dataclass
+class Node:
+    node_id: str
+    kind: str = "dma"                                  # dma, junction, source, sink
+    consumption_meters: list = field(default_factory=list)
+
+
+class NetworkModel:
+    """
+    Graph of nodes and metered pipes with its sparse incidence matrix.
+    """
+
+    def __init__(self, nodes: list, pipes: list):
+        self.nodes = nodes
+        self.pipes = pipes
+        self.node_index = {node.node_id: i for i, node in enumerate(nodes)}
+        self.pipe_index = {pipe.pipe_id: j for j, pipe in enumerate(pipes)}
+
+        rows, cols, values = [], [], []
+        for j, pipe in enumerate(pipes):
+            rows += [self.node_index[pipe.to_node], self.node_index[pipe.from_node]]
+            cols += [j, j]
+            values += [1.0, -1.0]
+
+        # Inflow only: used to express a residual as a share of what enters the node
+        self.incidence = sparse.csr_matrix((values, (rows, cols)), shape=(len(nodes), len(pipes)))
+        self.inflow = self.incidence.maximum(0).tocsr()
+
+        # Consumption meters aggregated per node: (nodes x consumption meters) 0/1 matrix
+        self.consumption_meters = [m for node in nodes for m in node.consumption_meters]
+        c_rows = [self.node_index[node.node_id] for node in nodes for _ in node.consumption_meters]
+        self.consumption = sparse.csr_matrix(
+            (np.ones(len(c_rows)), (c_rows, np.arange(len(c_rows)))),
+            shape=(len(nodes), len(c_rows)),
+        )
+
+        self.balanced = np.array([node.kind not in BOUNDARY_KINDS for node in nodes])
+
+    @classmethod
+    def from_json(cls, path: str = NETWORK_FILE) -> "NetworkModel":
+        with open(path, encoding="utf-8") as file_handle:
+            spec = json.load(file_handle)
+        return cls(
+            nodes=[Node(**node) for node in spec["nodes"]],
+            pipes=[Pipe(**pipe) for pipe in spec["pipes"]],
+        )
+
+    @property
+    def pipe_meters(self) -> list:
+        return [pipe.meter for pipe in self.pipes]
+
+
+class MassBalanceEngine:
+    """
+    Computes node residuals for whole time windows and ranks leak candidates.
+    """
+
+    def __init__(self, network: NetworkModel):
+        self.network = network
+
+    def residuals(self, flows: np.ndarray, consumption: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        flows: (pipes x T) metered flows; consumption: (consumption meters x T).
+        Returns (nodes x T) unaccounted water; NaN where a meter had no data.
+        """
+        flows = np.atleast_2d(flows)
+        missing = np.isnan(flows)
+        residual = self.network.incidence @ np.where(missing, 0.0, flows)
+
+        # A node is undefined at time t if any of its pipe meters is missing
+        incident = abs(self.network.incidence)
+        undefined = (incident @ missing.astype(np.float64)) > 0
+
+        if consumption is not None and self.network.consumption.shape[1]:
+            consumption = np.atleast_2d(consumption)
+            c_missing = np.isnan(consumption)
+            residual -= self.network.consumption @ np.where(c_missing, 0.0, consumption)
+            undefined |= (self.network.consumption @ c_missing.astype(np.float64)) > 0
+
+        residual[undefined] = np.nan
+        residual[~self.network.balanced] = np.nan
+        return residual
+
+    def rank(self, flows: np.ndarray, consumption: Optional[np.ndarray] = None, top: int = 10) -> list:
+        """
+        Ranks balanced nodes by how persistently water goes missing.
+
+        - loss: mean residual over the window
+        - loss_ratio: loss as a share of the mean inflow
+        - score: loss divided by its standard error, so a steady small loss
+          ranks above a large but noisy one
+        """
+        residual = self.residuals(flows, consumption)
+        steps = np.sum(~np.isnan(residual), axis=1)
+        valid = steps > 0
+
+        loss = np.full(len(residual), np.nan)
+        spread = np.full(len(residual), np.nan)
+        loss[valid] = np.nanmean(residual[valid], axis=1)
+        spread[valid] = np.nanstd(residual[valid], axis=1)
+
+        inflow = self.network.inflow @ np.nan_to_num(np.atleast_2d(flows))
+        inflow[np.isnan(residual)] = np.nan
+        inflow = np.where(valid, np.nanmean(np.where(valid[:, None], inflow, 0.0), axis=1), np.nan)
+        loss_ratio = np.divide(loss, inflow, out=np.full_like(loss, np.nan), where=inflow > 0)
+
+        stderr = spread / np.sqrt(np.maximum(steps, 1))
+        score = np.divide(loss, stderr, out=np.where(loss > 0, np.inf, 0.0), where=stderr > 1e-9)
+        score[~valid] = np.nan
+
+        order = np.argsort(np.where(np.isnan(score), np.inf, -score), kind="stable")[:top]
+        return [
+            {
+                "node": self.network.nodes[i].node_id,
+                "loss": _clean(loss[i]),
+                "loss_ratio": _clean(loss_ratio[i]),
+                "score": _clean(score[i]),
+                "steps": int(steps[i]),
+            }
+            for i in order
+            if valid[i]
+        ]
+
+
+def _clean(value: float) -> Optional[float]:
+    """JSON-safe float (NaN -> None, inf kept as a large number)."""
+    if np.isnan(value):
+        return None
+    if np.isinf(value):
+        return float(np.sign(value) * 1e9)
+    return round(float(value), 6)
+
+
+def meter_matrix(store, meters: list, start: float, end: float, resolution: str = "minute") -> np.ndarray:
+    """
+    Mean flow of each meter per rollup bucket between start and end
+    (float seconds), as a (meters x buckets) array with NaN for gaps.
+    Unmetered pipes (None) stay NaN.
+    """
+    return store.query_matrix(meters, resolution, start, end, metric="flow_rate")
@@ -0,0 +1,321 @@
+# backend/payload_formats.py
+
+# Decoding of sensor uploads in compact binary formats.
+#
+# Supported request bodies (selected by Content-Type):
+# - application/json                       one record, a list of records or a dict of columns
+# - application/msgpack                    same shapes as JSON, MessagePack encoded
+# - application/vnd.apache.arrow.stream    Arrow IPC stream, one column per field
+#
+# Bulk payloads are decoded straight into NumPy column arrays and validated
+# with vectorized masks, so a batch of readings never becomes thousands of
+# per-record Pydantic objects.
+
+import json
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+
+# Optional dependencies: the matching content types answer 415 without them
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+ARROW_TYPES = ("application/vnd.apache.arrow.stream", "application/vnd.apache.arrow.file")
+
+# Columns of a SensorData batch
+NUMERIC_FIELDS = ["water_level", "temperature", "flow_rate"]
+TEXT_FIELDS = ["device_id", "status"]
+
+# Numeric timestamps above this are epoch milliseconds, below epoch seconds (as in Pydantic)
+EPOCH_MS_THRESHOLD = 2e10
+
+
+@dataclass
+class SensorBatch:
+    """Column-oriented readings, one NumPy array per SensorData field."""
+    device_id: np.ndarray    # object (str)
+    water_level: np.ndarray  # float64
+    temperature: np.ndarray  # float64
+    flow_rate: np.ndarray    # float64
+    status: np.ndarray       # object (str or None)
+    timestamp: np.ndarray    # datetime64[ms], NaT when missing
+
+    def __len__(self):
+        return len(self.device_id)
+
+    def take(self, index) -> "SensorBatch":
+        return SensorBatch(**{name: getattr(self, name)[index] for name in self.__dataclass_fields__})
+
+    def record(self, i: int) -> dict:
+        """Returns row i as a plain dict (used for the few rows that need one)."""
+        timestamp = self.timestamp[i]
+        return {
+            "device_id": str(self.device_id[i]),
+            "water_level": float(self.water_level[i]),
+            "temperature": float(self.temperature[i]),
+            "flow_rate": float(self.flow_rate[i]),
+            "status": self.status[i],
+            "timestamp": None if np.isnat(timestamp) else timestamp.astype("datetime64[s]").item(),
+        }
+
+
+def media_type(content_type: str) -> str:
+    return (content_type or JSON_TYPE).split(";")[0].strip().lower()
+
+
+# ===============================
+# Body Decoding
+# ===============================
+def decode_body(body: bytes, content_type: str):
+    """
+    Decodes a JSON or MessagePack body into Python objects.
+    Arrow bodies are not handled here, see decode_arrow().
+    """
+    kind = media_type(content_type)
+
+    if kind in MSGPACK_TYPES:
+        if msgpack is None:
+            raise HTTPException(status_code=415, detail="MessagePack support requires the msgpack package")
+        try:
+            return msgpack.unpackb(body, raw=False, timestamp=3)
+        except Exception as error:
+            raise HTTPException(status_code=400, detail=f"Invalid MessagePack body: {error}")
+
+    if kind == JSON_TYPE or kind.endswith("+json"):
+        try:
+            return json.loads(body)
+        except ValueError as error:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {error}")
+
+    raise HTTPException(status_code=415, detail=f"Unsupported content type: {kind}")
+
+
+def decode_arrow(body: bytes) -> SensorBatch:
+    """Reads an Arrow IPC stream (or file) into column arrays without per-row objects."""
+    if pa is None:
+        raise HTTPException(status_code=415, detail="Arrow support requires the pyarrow package")
+
+    try:
+        try:
+            table = pa.ipc.open_stream(body).read_all()
+        except pa.ArrowInvalid:
+            table = pa.ipc.open_file(pa.BufferReader(body)).read_all()
+    except Exception as error:
+        raise HTTPException(status_code=400, detail=f"Invalid Arrow body: {error}")
+
+    columns = {
+        name: table.column(name).to_numpy(zero_copy_only=False)
+        for name in table.column_names
+    }
+    # to_numpy() drops the zone of aware timestamp columns (values are UTC)
+    if "timestamp" in columns and pa.types.is_timestamp(table.schema.field("timestamp").type) \
+            and table.schema.field("timestamp").type.tz:
+        columns["timestamp"] = _local_wall_clock(table.column("timestamp").to_pandas())
+    return columns_to_batch(columns, len(table))
+
+
+def decode_batch(body: bytes, content_type: str) -> SensorBatch:
+    """
+    Decodes any supported batch body. JSON and MessagePack accept either
+    a dict of columns (fastest) or a list of records.
+    """
+    if media_type(content_type) in ARROW_TYPES:
+        return decode_arrow(body)
+
+    payload = decode_body(body, content_type)
+
+    if isinstance(payload, dict):
+        # Every known column must be a list: a scalar would become a 0-d array
+        columns = {
+            name: payload[name]
+            for name in NUMERIC_FIELDS + TEXT_FIELDS + ["timestamp"]
+            if name in payload
+        }
+        not_lists = sorted(name for name, values in columns.items() if not isinstance(values, list))
+        if not_lists:
+            raise HTTPException(status_code=400, detail=f"Columns must be lists: {not_lists}")
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise HTTPException(status_code=400, detail="Columns must be lists of equal length")
+        return columns_to_batch(columns, lengths.pop())
+
+    if isinstance(payload, list):
+        if not all(isinstance(row, dict) for row in payload):
+            raise HTTPException(status_code=400, detail="Records must be JSON objects")
+        columns = {
+            name: [row.get(name) for row in payload]
+            for name in NUMERIC_FIELDS + TEXT_FIELDS + ["timestamp"]
+        }
+        return columns_to_batch(columns, len(payload))
+
+    raise HTTPException(status_code=400, detail="Batch body must be a list of records or a dict of columns")
+
+
+def columns_to_batch(columns: dict, length: int) -> SensorBatch:
+    def text(name):
+        values = columns.get(name)
+        if values is None:
+            return np.full(length, None, dtype=object)
+        return np.asarray(values, dtype=object)
+
+    def numeric(name):
+        values = columns.get(name)
+        if values is None:
+            return np.full(length, np.nan)
+        try:
+            return np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            # None / non-numeric entries become NaN and fail validation
+            return np.array([_to_float(v) for v in values], dtype=np.float64)
+
+    timestamps = columns.get("timestamp")
+    if timestamps is None:
+        timestamp = np.full(length, np.datetime64("NaT"), dtype="datetime64[ms]")
+    else:
+        try:
+            timestamp = parse_timestamps(timestamps)
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise HTTPException(status_code=400,
+                                detail="timestamp must contain ISO 8601 datetimes or Unix epoch seconds")
+
+    return SensorBatch(
+        device_id=text("device_id"),
+        water_level=numeric("water_level"),
+        temperature=numeric("temperature"),
+        flow_rate=numeric("flow_rate"),
+        status=text("status"),
+        timestamp=timestamp,
+    )
+
+
+def _local_wall_clock(stamps: pd.Series) -> np.ndarray:
+    """
+    Aware timestamps -> naive local wall-clock datetime64[ms] (the
+    timeseries_store convention). The local UTC offset is looked up once per
+    distinct minute: converting to dateutil's tzlocal() is ~20x slower.
+    """
+    utc = stamps.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy(dtype="datetime64[ms]")
+    minutes, inverse = np.unique(utc.astype("datetime64[m]"), return_inverse=True)
+    offsets = np.array([time.localtime(int(m.astype(np.int64)) * 60).tm_gmtoff for m in minutes])
+    return utc + (offsets[inverse] * 1000).astype("timedelta64[ms]")
+
+
+def parse_timestamps(values) -> np.ndarray:
+    """
+    Timestamp column -> datetime64[ms] in local wall-clock time, NaT when missing.
+    Reads values like SensorData does: numbers are Unix epoch seconds
+    (milliseconds above EPOCH_MS_THRESHOLD), ISO 8601 strings and datetimes
+    with an offset are converted to local time, naive ones are kept as sent.
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+        # Arrow timestamp column without a zone: already wall-clock time
+        return values.astype("datetime64[ms]")
+
+    items = pd.Series(values, dtype=object)
+    result = np.full(len(items), np.datetime64("NaT"), dtype="datetime64[ms]")
+    present = items.notna().to_numpy()
+    numeric = present & np.array(
+        [isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_)) for v in items],
+        dtype=bool,
+    )
+
+    if numeric.any():
+        epoch = items[numeric].astype(np.float64)
+        milliseconds = np.where(np.abs(epoch) > EPOCH_MS_THRESHOLD, epoch, epoch * 1000)
+        result[numeric] = _local_wall_clock(pd.Series(pd.to_datetime(milliseconds, unit="ms", utc=True)))
+
+    text = present & ~numeric
+    if text.any():
+        try:
+            parsed = pd.to_datetime(items[text], format="ISO8601")
+        except ValueError:
+            # Naive and aware values (or several offsets) mixed: convert one by one
+            parsed = None
+        if parsed is None:
+            stamps = [pd.Timestamp(v) for v in items[text]]
+            aware = np.array([stamp.tzinfo is not None for stamp in stamps], dtype=bool)
+            converted = np.array(
+                [np.datetime64("NaT") if stamp.tzinfo else stamp.to_datetime64() for stamp in stamps],
+                dtype="datetime64[ms]",
+            )
+            converted[aware] = _local_wall_clock(
+                pd.Series([stamp.tz_convert("UTC") for stamp in stamps if stamp.tzinfo], dtype="datetime64[ms, UTC]")
+            )
+            result[text] = converted
+        elif parsed.dt.tz is not None:
+            result[text] = _local_wall_clock(parsed)
+        else:
+            result[text] = parsed.to_numpy(dtype="datetime64[ms]")
+
+    return result
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# ===============================
+# Vectorized Validation & Leak Rules
+# ===============================
+def validate_batch(batch: SensorBatch):
+    """
+    Applies the SensorData rules to every row at once.
+    Returns (valid_mask, rejected) where rejected lists {index, detail}.
+    """
+    device_ok = np.array([isinstance(d, str) and len(d) > 0 for d in batch.device_id], dtype=bool) \
+        if len(batch) else np.zeros(0, dtype=bool)
+
+    checks = [
+        ("device_id must be a non-empty string", device_ok),
+        ("water_level must be >= 0", np.isfinite(batch.water_level) & (batch.water_level >= 0)),
+        ("temperature is required", np.isfinite(batch.temperature)),
+        ("flow_rate must be > 0", np.isfinite(batch.flow_rate) & (batch.flow_rate > 0)),
+    ]
+
+    valid = np.ones(len(batch), dtype=bool)
+    for _, mask in checks:
+        valid &= mask
+
+    rejected = []
+    for index in np.flatnonzero(~valid):
+        detail = [message for message, mask in checks if not mask[index]]
+        rejected.append({"index": int(index), "detail": detail})
+
+    return valid, rejected
+
+
+def detect_leaks(batch: SensorBatch, threshold: float) -> np.ndarray:
+    """Vectorized version of the /ingest leak rule (status or flow threshold)."""
+    status = np.char.lower(np.char.strip(batch.status.astype(str)))
+    return (status == "leak") | (batch.flow_rate >= threshold)
+
+
+# ===============================
+# Response Negotiation
+# ===============================
+def encode_response(content: dict, accept: str = None) -> Response:
+    """Answers in MessagePack when the client asks for it, JSON otherwise."""
+    accepted = [media_type(part) for part in (accept or "").split(",")]
+
+    if msgpack is not None and any(kind in MSGPACK_TYPES for kind in accepted):
+        return Response(msgpack.packb(content, use_bin_type=True), media_type=MSGPACK_TYPES[0])
+
+    return JSONResponse(content)
@@ -0,0 +1,255 @@
+# backend/profiler.py
+
+# On-demand sampling profiler for the API.
+# A background thread periodically snapshots the Python stacks of all
+# threads (sys._current_frames) and counts identical stacks. The result is
+# exported in the "collapsed stacks" format understood by flamegraph.pl,
+# speedscope and inferno:  frame1;frame2;frame3 <count>
+#
+# While no profile is running the middleware only checks a boolean,
+# so the cost on /ingest and /predict/* is negligible.
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+try:
+    from backend.auth import verify_admin_key
+except ImportError:
+    from auth import verify_admin_key
+
+
+# Default time between two stack samples (seconds)
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Hard upper bound on a profiling session, whatever the caller asks for
+MAX_PROFILE_DURATION = 120.0
+
+# Leaf frames of threads that are just waiting for work.
+# They are skipped unless include_idle=True, otherwise idle worker
+# threads dominate the profile.
+IDLE_LEAF_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("base_events.py", "_run_once"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAF_FRAMES
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every running thread for a bounded duration
+    or number of requests, whichever comes first.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.active = False
+        self.include_idle = False
+        self.max_requests: Optional[int] = None
+        self.requests_seen = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self.deadline: Optional[float] = None
+        self.samples = 0
+        self._session = 0
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, duration: float = 10.0, max_requests: Optional[int] = None,
+              interval: Optional[float] = None, include_idle: bool = False) -> bool:
+        """
+        Starts a new profiling session and discards the previous profile.
+        Returns False if a session is already running.
+        """
+        with self._lock:
+            if self.active:
+                return False
+
+            self._stacks = Counter()
+            self.samples = 0
+            self.requests_seen = 0
+            self.max_requests = max_requests
+            self.include_idle = include_idle
+            if interval:
+                self.interval = interval
+
+            self.started_at = time.time()
+            self.stopped_at = None
+            self.deadline = time.monotonic() + min(duration, MAX_PROFILE_DURATION)
+            self.active = True
+            self._session += 1
+
+            self._thread = threading.Thread(
+                target=self._run, args=(self._session,), name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def stop(self) -> None:
+        """Ends the current session; the collected profile is kept."""
+        with self._lock:
+            if self.active:
+                self.active = False
+                self.stopped_at = time.time()
+
+    def record_request(self) -> None:
+        """Called by the middleware after each profiled request."""
+        with self._lock:
+            self.requests_seen += 1
+            done = self.max_requests is not None and self.requests_seen >= self.max_requests
+        if done:
+            self.stop()
+
+    def _run(self, session: int) -> None:
+        own_id = threading.get_ident()
+
+        # A sampler from a previous session may still be sleeping when a new
+        # one starts; the session number makes it exit instead of double counting
+        while self.active and self._session == session:
+            if time.monotonic() >= self.deadline:
+                self.stop()
+                break
+
+            self._sample(own_id, session)
+            time.sleep(self.interval)
+
+    def _sample(self, own_id: int, session: int) -> None:
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            if not self.include_idle and _is_idle(frame):
+                continue
+
+            # Walk from leaf to root, then reverse: collapsed stacks are root first
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            stacks.append(";".join(stack))
+
+        # Counters are shared with request threads reading the profile
+        with self._lock:
+            if self._session != session:
+                return
+            self._stacks.update(stacks)
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Returns the profile in collapsed stack format, one stack per line."""
+        with self._lock:
+            stacks = self._stacks.copy()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "active": self.active,
+                "started_at": self.started_at,
+                "stopped_at": self.stopped_at,
+                "interval": self.interval,
+                "samples": self.samples,
+                "requests_seen": self.requests_seen,
+                "max_requests": self.max_requests,
+                "unique_stacks": len(self._stacks),
+            }
+
+
+class ProfilerMiddleware:
+    """
+    Plain ASGI middleware counting requests while a profile is running.
+    When the profiler is idle it forwards the call untouched.
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler, excluded_prefix: str = "/admin/profile"):
+        self.app = app
+        self.profiler = profiler
+        self.excluded_prefix = excluded_prefix
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.active or scope["type"] != "http" \
+                or scope["path"].startswith(self.excluded_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.record_request()
+
+
+# Shared instance used by the API
+profiler = SamplingProfiler()
+
+
+# ===============================
+# Admin Endpoints
+# ===============================
+class ProfileRequest(BaseModel):
+    """Bounds of a profiling session; it stops at whichever limit is reached first."""
+    duration: float = Field(10.0, gt=0, le=MAX_PROFILE_DURATION)
+    max_requests: Optional[int] = Field(None, gt=0)
+    interval_ms: float = Field(DEFAULT_SAMPLE_INTERVAL * 1000, ge=1, le=1000)
+    include_idle: bool = False
+
+
+router = APIRouter(prefix="/admin/profile", dependencies=[Depends(verify_admin_key)])
+
+
+@router.post("/start")
+def start_profile(data: ProfileRequest):
+    """
+    Starts sampling all threads until the duration elapses
+    or max_requests requests have been served.
+    """
+    started = profiler.start(
+        duration=data.duration,
+        max_requests=data.max_requests,
+        interval=data.interval_ms / 1000,
+        include_idle=data.include_idle,
+    )
+    if not started:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return profiler.status()
+
+
+@router.post("/stop")
+def stop_profile():
+    profiler.stop()
+    return profiler.status()
+
+
+@router.get("/status")
+def profile_status():
+    return profiler.status()
+
+
+@router.get("", response_class=PlainTextResponse)
+def get_profile():
+    """
+    Returns the last profile as collapsed stacks, ready for
+    flamegraph.pl, speedscope or inferno.
+    """
+    return profiler.collapsed()
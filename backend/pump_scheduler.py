@@ -0,0 +1,213 @@
+# backend/pump_scheduler.py
+
+# Cheapest pump / valve schedule over the forecast horizon (default 24 h).
+#
+# Linear program solved locally with HiGHS:
+#   variables  q[p, t]  flow pumped by pump p in hour t       (m3/h)
+#              v[z, t]  flow released to zone z in hour t      (m3/h)
+#              s[t]     water in the storage tank after hour t (m3)
+#   minimize   sum tariff[t] * kWh/m3(p, t) * q[p, t]
+#   subject to s[t] = s[t-1] + sum_p q[p, t] - sum_z v[z, t]
+#              sum_t v[z, t] >= demand[z]
+#              0 <= q <= pump capacity, 0 <= v <= valve capacity,
+#              0 <= s <= tank capacity, s[T-1] >= final level
+#
+# Pumping energy grows with the lift, i.e. the forecast depth to groundwater
+# (forecast_for_or output) plus the static head of each pump.
+#
+# Consecutive horizons have the same shape, so the HiGHS model is kept and
+# only costs and bounds are updated: the solver restarts from the previous
+# optimal basis instead of solving from scratch.
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import highspy
+import numpy as np
+from scipy import sparse
+
+
+# Energy to lift 1 m3 by 1 m: rho * g / 3.6e6 (kWh)
+KWH_PER_M3_M = 1000 * 9.81 / 3.6e6
+
+# Default time-of-use tariff (MAD/kWh): off-peak night, normal day, evening peak
+DEFAULT_TARIFFS = [
+    {"start_hour": 0, "end_hour": 7, "price": 0.85},
+    {"start_hour": 7, "end_hour": 17, "price": 1.10},
+    {"start_hour": 17, "end_hour": 22, "price": 1.55},
+    {"start_hour": 22, "end_hour": 24, "price": 0.85},
+]
+
+
+@dataclass
+class Pump:
+    name: str
+    capacity: float          # m3/h
+    efficiency: float = 0.7  # wire-to-water
+    static_head: float = 0.0  # m, added to the groundwater depth
+
+
+@dataclass
+class ZoneDemand:
+    zone: str
+    demand: float    # m3 over the horizon
+    max_flow: float  # m3/h through the zone valve
+
+
+@dataclass
+class Tank:
+    capacity: float
+    initial: float = 0.0
+    final_min: Optional[float] = None  # defaults to the initial level
+
+
+def hourly_tariff(timestamps: list, tariffs: Optional[list] = None) -> np.ndarray:
+    """Price of each forecast hour from [{start_hour, end_hour, price}] periods."""
+    prices = np.full(24, np.nan)
+    for period in tariffs or DEFAULT_TARIFFS:
+        prices[int(period["start_hour"]):int(period["end_hour"])] = period["price"]
+    if np.isnan(prices).any():
+        raise ValueError("Tariff periods must cover all 24 hours")
+    return prices[[ts.hour for ts in timestamps]]
+
+
+class PumpScheduler:
+    """
+    Keeps one HiGHS model and re-solves it for each new horizon.
+    """
+
+    def __init__(self):
+        self._highs = None
+        self._shape = None
+        self._lock = threading.Lock()
+
+    def _build(self, shape: tuple, cost, col_lower, col_upper, row_lower, row_upper) -> None:
+        pumps, zones, hours = shape
+        n_q, n_v = pumps * hours, zones * hours
+        t = np.arange(hours)
+
+        # Storage balance rows: s[t] - s[t-1] - sum_p q[p, t] + sum_z v[z, t] = (initial if t == 0 else 0)
+        rows = [np.tile(t, pumps), np.tile(t, zones), t, t[1:]]
+        cols = [np.arange(n_q), n_q + np.arange(n_v), n_q + n_v + t, n_q + n_v + t[:-1]]
+        vals = [-np.ones(n_q), np.ones(n_v), np.ones(hours), -np.ones(hours - 1)]
+
+        # Demand rows: sum_t v[z, t] >= demand[z]
+        rows.append(hours + np.repeat(np.arange(zones), hours))
+        cols.append(n_q + np.arange(n_v))
+        vals.append(np.ones(n_v))
+
+        matrix = sparse.csr_matrix(
+            (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(hours + zones, n_q + n_v + hours),
+        )
+
+        highs = highspy.Highs()
+        highs.setOptionValue("output_flag", False)
+        highs.addCols(len(cost), cost, col_lower, col_upper, 0, np.array([], dtype=np.int32),
+                      np.array([], dtype=np.int32), np.array([]))
+        highs.addRows(matrix.shape[0], row_lower, row_upper, matrix.nnz,
+                      matrix.indptr.astype(np.int32), matrix.indices.astype(np.int32), matrix.data)
+        self._highs = highs
+        self._shape = shape
+
+    def solve(self, timestamps: list, depths, pumps: list, zones: list, tank: Tank,
+              tariffs: Optional[list] = None) -> dict:
+        hours = len(timestamps)
+        depths = np.asarray(depths, dtype=np.float64)
+        prices = hourly_tariff(timestamps, tariffs)
+
+        # kWh per m3 of each pump in each hour: (pumps x hours)
+        lift = depths[None, :] + np.array([p.static_head for p in pumps])[:, None]
+        kwh_per_m3 = KWH_PER_M3_M * np.maximum(lift, 0.0) / np.array([p.efficiency for p in pumps])[:, None]
+
+        n_q, n_v = len(pumps) * hours, len(zones) * hours
+        cost = np.concatenate([(kwh_per_m3 * prices).ravel(), np.zeros(n_v + hours)])
+
+        final_min = tank.initial if tank.final_min is None else tank.final_min
+        col_lower = np.zeros(n_q + n_v + hours)
+        col_upper = np.concatenate([
+            np.repeat([p.capacity for p in pumps], hours),
+            np.repeat([z.max_flow for z in zones], hours),
+            np.full(hours, tank.capacity),
+        ])
+        col_lower[-1] = min(final_min, tank.capacity)
+
+        row_lower = np.concatenate([[tank.initial], np.zeros(hours - 1), [z.demand for z in zones]])
+        row_upper = np.concatenate([[tank.initial], np.zeros(hours - 1), np.full(len(zones), highspy.kHighsInf)])
+
+        shape = (len(pumps), len(zones), hours)
+        with self._lock:
+            warm = self._shape == shape
+            if warm:
+                index = np.arange(len(cost), dtype=np.int32)
+                self._highs.changeColsCost(len(cost), index, cost)
+                self._highs.changeColsBounds(len(cost), index, col_lower, col_upper)
+                rows = np.arange(len(row_lower), dtype=np.int32)
+                self._highs.changeRowsBounds(len(row_lower), rows, row_lower, row_upper)
+            else:
+                self._build(shape, cost, col_lower, col_upper, row_lower, row_upper)
+
+            started = time.perf_counter()
+            self._highs.run()
+            solve_ms = (time.perf_counter() - started) * 1000
+
+            status = self._highs.getModelStatus()
+            iterations = self._highs.getInfo().simplex_iteration_count
+            if status != highspy.HighsModelStatus.kOptimal:
+                # Drop the model so the next horizon does not start from a bad basis
+                self._shape = None
+                raise ValueError(f"No feasible schedule: {self._highs.modelStatusToString(status)}")
+            x = np.array(self._highs.getSolution().col_value)
+
+        q = x[:n_q].reshape(len(pumps), hours)
+        v = x[n_q:n_q + n_v].reshape(len(zones), hours)
+        s = x[n_q + n_v:]
+        energy = kwh_per_m3 * q
+
+        schedule = [
+            {
+                "timestamp": timestamps[t].isoformat(),
+                "tariff": float(prices[t]),
+                "depth": float(depths[t]),
+                "pumps": {p.name: _flow(q[i, t]) for i, p in enumerate(pumps)},
+                "valves": {z.zone: _flow(v[j, t]) for j, z in enumerate(zones)},
+                "storage": _flow(s[t]),
+            }
+            for t in range(hours)
+        ]
+        return {
+            "schedule": schedule,
+            "total_cost": round(float((energy * prices).sum()), 3),
+            "total_energy_kwh": round(float(energy.sum()), 3),
+            "solver": {
+                "status": "optimal",
+                "solve_ms": round(solve_ms, 3),
+                "iterations": int(iterations),
+                "warm_start": warm,
+            },
+        }
+
+
+def _flow(value: float) -> float:
+    """Rounded solver value, without the -0.0 HiGHS returns for tiny negatives."""
+    return round(float(value), 3) + 0.0
+
+
+# Shared instance so consecutive horizons reuse the same model
+pump_scheduler = PumpScheduler()
+
+
+def schedule_from_forecast(forecast, pumps: list, zones: list, tank: Tank,
+                           tariffs: Optional[list] = None) -> dict:
+    """
+    Schedules directly from forecast_for_or output (DataFrame or records with
+    `Timestamp` and `Predicted_Depth`).
+    """
+    records = forecast.to_dict("records") if hasattr(forecast, "to_dict") else list(forecast)
+    if not records:
+        raise ValueError("Forecast is empty")
+    timestamps = [r["Timestamp"] for r in records]
+    depths = [r["Predicted_Depth"] for r in records]
+    return pump_scheduler.solve(timestamps, depths, pumps, zones, tank, tariffs)
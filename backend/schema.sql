@@ -8,16 +8,33 @@ CREATE TABLE IF NOT EXISTS notification_preferences (
     email_address TEXT,
     FOREIGN KEY(user_id) REFERENCES users(id)
 );
-CREATE TABLE control_commands (
+CREATE TABLE IF NOT EXISTS control_commands (
 
     id INTEGER PRIMARY KEY AUTOINCREMENT,
 
     device TEXT,
 
+    zone TEXT,
+
     command TEXT,
 
     status TEXT,
 
     timestamp TEXT
 
-);
\ No newline at end of file
+);
+CREATE INDEX IF NOT EXISTS idx_control_commands_device_time ON control_commands (device, timestamp);
+CREATE INDEX IF NOT EXISTS idx_control_commands_time ON control_commands (timestamp);
+
+-- Leak alerts (previously only in frontend/alert_logs.csv)
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id TEXT,
+    flow_rate REAL,
+    water_level REAL,
+    temperature REAL,
+    status TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_device_time ON alerts (device_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts (timestamp);
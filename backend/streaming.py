@@ -0,0 +1,114 @@
+# backend/streaming.py
+
+# Helpers for streaming ingestion (WebSocket and NDJSON over HTTP).
+# Records flow through a bounded queue between the reader and the
+# processing loop: when processing falls behind, the queue fills up, the
+# reader stops pulling from the socket and TCP flow control pushes back
+# on the gateway instead of buffering unbounded data in the server.
+
+import asyncio
+import json
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable
+
+from starlette.responses import StreamingResponse
+
+
+# Maximum number of records read ahead of the processing loop
+STREAM_QUEUE_SIZE = 256
+
+# Protect the server against a gateway that never sends a newline
+MAX_LINE_BYTES = 64 * 1024
+
+_END = object()
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Streaming response that does not poll the client for disconnects.
+
+    The default StreamingResponse listens on `receive` while streaming,
+    which would swallow the request body chunks we are still reading.
+    Disconnects are detected by the body reader instead.
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_ndjson(chunks: AsyncIterable[bytes], max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator:
+    """
+    Splits a chunked byte stream into decoded JSON records.
+    Yields the parsed object, or a ValueError for a malformed line.
+    """
+    buffer = b""
+
+    async for chunk in chunks:
+        buffer += chunk
+
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            if line.strip():
+                yield decode_record(line)
+
+        if len(buffer) > max_line_bytes:
+            yield ValueError(f"Line exceeds {max_line_bytes} bytes")
+            buffer = b""
+
+    if buffer.strip():
+        yield decode_record(buffer)
+
+
+def decode_record(raw):
+    """Parses one JSON record; malformed input is returned as a ValueError."""
+    try:
+        return json.loads(raw)
+    except ValueError as error:
+        return ValueError(f"Invalid JSON: {error}")
+
+
+async def pipelined(
+    source: AsyncIterable,
+    handler: Callable[[object], Awaitable[dict]],
+    maxsize: int = STREAM_QUEUE_SIZE,
+) -> AsyncIterator[dict]:
+    """
+    Reads `source` into a bounded queue and yields `handler(item)` for each
+    item, in order. Reading overlaps with processing but never runs more
+    than `maxsize` items ahead of it.
+    """
+    queue = asyncio.Queue(maxsize=maxsize)
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put(item)  # waits while the queue is full
+        except asyncio.CancelledError:
+            # The consumer is gone: nobody reads the end marker, and waiting
+            # for room in a full queue would never return
+            raise
+        except Exception:
+            await queue.put(_END)
+            raise
+        await queue.put(_END)
+
+    producer = asyncio.create_task(produce())
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            result = await handler(item)
+            result["backlog"] = queue.qsize()
+            yield result
+
+        # Surface errors raised while reading (e.g. client disconnect)
+        await producer
+    finally:
+        # The producer never outlives the stream
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
@@ -0,0 +1,267 @@
+# backend/timeseries_store.py
+
+# In-memory time-series store for sensor readings.
+#
+# - Recent raw readings are kept per device in fixed-size ring buffers.
+# - Minute / hour / day rollups (count, sum, min, max, last) are updated
+#   incrementally on every reading, so range and aggregate queries read
+#   precomputed buckets instead of scanning raw rows.
+#
+# Timestamps are handled as naive local wall-clock times (like the CSV log,
+# the simulator and datetime.now()) and stored as float seconds.
+# Timezone-aware timestamps are converted to local wall-clock time first,
+# so readings sent with an offset or "Z" land in the same windows as the rest.
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+
+METRICS = ["flow_rate", "water_level", "temperature"]
+
+# Raw readings kept per device
+RAW_CAPACITY = 4096
+
+# Rollup resolutions: bucket width (seconds) and number of buckets retained
+RESOLUTIONS = {
+    "minute": (60, 2 * 24 * 60),   # 2 days
+    "hour": (3600, 90 * 24),       # 90 days
+    "day": (86400, 5 * 366),       # 5 years
+}
+
+# Column order of a rollup bucket
+COUNT, SUM, MIN, MAX, LAST = range(5)
+
+
+def to_seconds(value: Optional[datetime]) -> float:
+    """
+    Local wall-clock datetime -> float seconds; now() when missing.
+    Aware values are converted to local wall-clock time first.
+    """
+    value = value or datetime.now()
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def from_seconds(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(tzinfo=None)
+
+
+class RingBuffer:
+    """Fixed-capacity buffer of (time, metrics) rows, oldest rows overwritten first."""
+
+    def __init__(self, capacity: int = RAW_CAPACITY, width: int = len(METRICS)):
+        self.times = np.zeros(capacity)
+        self.values = np.zeros((capacity, width))
+        self.capacity = capacity
+        self.head = 0   # next write position
+        self.size = 0
+
+    def append(self, t: float, values) -> None:
+        self.times[self.head] = t
+        self.values[self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def ordered(self):
+        """Returns (times, values) in insertion order."""
+        if self.size < self.capacity:
+            return self.times[:self.size], self.values[:self.size]
+        order = np.r_[self.head:self.capacity, 0:self.head]
+        return self.times[order], self.values[order]
+
+
+class Rollup:
+    """Buckets of one resolution for one device: bucket start -> (metrics x stats) array."""
+
+    def __init__(self, width: int, max_buckets: int):
+        self.width = width
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()
+
+    def add(self, t: float, values: np.ndarray) -> None:
+        start = int(t // self.width) * self.width
+        row = self.buckets.get(start)
+
+        if row is None:
+            row = np.empty((len(values), 5))
+            row[:, COUNT] = 0
+            row[:, SUM] = 0
+            row[:, MIN] = np.inf
+            row[:, MAX] = -np.inf
+            self.buckets[start] = row
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+
+        row[:, COUNT] += 1
+        row[:, SUM] += values
+        np.minimum(row[:, MIN], values, out=row[:, MIN])
+        np.maximum(row[:, MAX], values, out=row[:, MAX])
+        row[:, LAST] = values
+
+    def range(self, start: float, end: float):
+        """Returns (bucket_starts, stacked rows) for buckets in [start, end]."""
+        keys = [k for k in self.buckets if start <= k <= end]
+        keys.sort()
+        if not keys:
+            return np.zeros(0), np.zeros((0, len(METRICS), 5))
+        return np.array(keys, dtype=np.float64), np.stack([self.buckets[k] for k in keys])
+
+
+class TimeSeriesStore:
+    """
+    Raw ring buffers plus incremental rollups, per device.
+    """
+
+    def __init__(self, raw_capacity: int = RAW_CAPACITY):
+        self.raw_capacity = raw_capacity
+        self.raw = {}       # device_id -> RingBuffer
+        self.rollups = {}   # device_id -> {resolution: Rollup}
+        self._lock = threading.Lock()
+
+    def _device(self, device_id: str):
+        buffer = self.raw.get(device_id)
+        if buffer is None:
+            buffer = self.raw[device_id] = RingBuffer(self.raw_capacity)
+            self.rollups[device_id] = {
+                name: Rollup(width, max_buckets)
+                for name, (width, max_buckets) in RESOLUTIONS.items()
+            }
+        return buffer, self.rollups[device_id]
+
+    def _append(self, device_id: str, t: float, values: np.ndarray) -> None:
+        buffer, rollups = self._device(device_id)
+        buffer.append(t, values)
+        for rollup in rollups.values():
+            rollup.add(t, values)
+
+    def add(self, device_id: str, timestamp: Optional[datetime], flow_rate: float,
+            water_level: float, temperature: float) -> None:
+        values = np.array([flow_rate, water_level, temperature], dtype=np.float64)
+        with self._lock:
+            self._append(device_id, to_seconds(timestamp), values)
+
+    def add_many(self, device_ids, timestamps, values: np.ndarray) -> None:
+        """
+        Adds a batch of readings. `timestamps` is a datetime64 array (NaT = now),
+        `values` an (n, len(METRICS)) array in METRICS order.
+        """
+        seconds = timestamps.astype("datetime64[ms]").astype(np.float64) / 1000.0
+        seconds[np.isnat(timestamps)] = to_seconds(None)
+
+        with self._lock:
+            for i in range(len(values)):
+                self._append(device_ids[i], seconds[i], values[i])
+
+    def devices(self) -> list:
+        return sorted(self.raw)
+
+    # ===============================
+    # Queries
+    # ===============================
+    def query_raw(self, device_id: str, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, limit: Optional[int] = None) -> list:
+        """Raw readings of one device within [start, end], oldest first."""
+        with self._lock:
+            buffer = self.raw.get(device_id)
+            if buffer is None:
+                return []
+            times, values = buffer.ordered()
+
+        lo = to_seconds(start) if start else -np.inf
+        hi = to_seconds(end) if end else np.inf
+        mask = (times >= lo) & (times <= hi)
+        times, values = times[mask], values[mask]
+        if limit:
+            times, values = times[-limit:], values[-limit:]
+
+        return [
+            {"timestamp": from_seconds(t).isoformat(), **dict(zip(METRICS, row.tolist()))}
+            for t, row in zip(times, values)
+        ]
+
+    def query_buckets(self, device_ids: list, resolution: str,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None):
+        """
+        Rollup buckets of one or more devices within [start, end], merged per bucket.
+        Returns (bucket_starts, rows) where rows has shape (buckets, metrics, 5).
+        """
+        lo = to_seconds(start) if start else -np.inf
+        hi = to_seconds(end) if end else np.inf
+
+        merged = {}
+        with self._lock:
+            for device_id in device_ids:
+                rollups = self.rollups.get(device_id)
+                if rollups is None:
+                    continue
+                for key, row in zip(*rollups[resolution].range(lo, hi)):
+                    current = merged.get(key)
+                    if current is None:
+                        merged[key] = row.copy()
+                    else:
+                        current[:, COUNT] += row[:, COUNT]
+                        current[:, SUM] += row[:, SUM]
+                        np.minimum(current[:, MIN], row[:, MIN], out=current[:, MIN])
+                        np.maximum(current[:, MAX], row[:, MAX], out=current[:, MAX])
+                        current[:, LAST] = row[:, LAST]
+
+        keys = sorted(merged)
+        if not keys:
+            return np.zeros(0), np.zeros((0, len(METRICS), 5))
+        return np.array(keys, dtype=np.float64), np.stack([merged[k] for k in keys])
+
+    def query_matrix(self, device_ids: list, resolution: str, start: float, end: float,
+                     metric: str = "flow_rate") -> np.ndarray:
+        """
+        Mean of one metric per device and rollup bucket between start and end
+        (float seconds), as a (devices x buckets) array with NaN for gaps and
+        for None device ids. Reads every device under a single lock, looking
+        up only the buckets of the window.
+        """
+        width = RESOLUTIONS[resolution][0]
+        first = int(start // width) * width
+        steps = int((end - first) // width) + 1
+        keys = [first + j * width for j in range(steps)]
+        column = METRICS.index(metric)
+
+        sums = np.zeros((len(device_ids), steps))
+        counts = np.zeros((len(device_ids), steps))
+        with self._lock:
+            for i, device_id in enumerate(device_ids):
+                rollups = self.rollups.get(device_id)
+                if rollups is None:
+                    continue
+                buckets = rollups[resolution].buckets
+                for j, key in enumerate(keys):
+                    row = buckets.get(key)
+                    if row is not None:
+                        sums[i, j] = row[column, SUM]
+                        counts[i, j] = row[column, COUNT]
+
+        matrix = np.full(sums.shape, np.nan)
+        np.divide(sums, counts, out=matrix, where=counts > 0)
+        return matrix
+
+    def query_rollup(self, device_id: str, resolution: str, metric: str = "flow_rate",
+                     start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+        """Aggregates of one metric per bucket, oldest first."""
+        keys, rows = self.query_buckets([device_id], resolution, start, end)
+        stats = rows[:, METRICS.index(metric), :]
+
+        return [
+            {
+                "bucket": from_seconds(key).isoformat(),
+                "count": int(row[COUNT]),
+                "sum": float(row[SUM]),
+                "mean": float(row[SUM] / row[COUNT]),
+                "min": float(row[MIN]),
+                "max": float(row[MAX]),
+                "last": float(row[LAST]),
+            }
+            for key, row in zip(keys, stats)
+        ]
@@ -9,6 +9,13 @@ from datetime import datetime, timedelta
 from components.decision_box import render_decision_box
 from components.controls import render_pump_controls
 from components.analytics import render_analytics
+from components.command_log import render_command_log
+from components.cache import file_version, rerun_timer, shared_cache
+from components.live_updates import live_feed
+from components.sensor_table import render_sensor_history
+from components.devices import devices_in_zone, devices_version, load_devices, zone_options
+
+rerun_started = time.perf_counter()
 
 # 1. Configuration & Branding
 st.set_page_config(page_title="Engrammers | Smart Water Management", layout="wide")
@@ -89,7 +96,7 @@ CROP_THRESHOLDS = {
 # 4. Data Loading Logic
 LOG_FILE = "alert_logs.csv"
 
-def load_data():
+def _read_log():
     """Load sensor data from CSV, handling optional columns gracefully"""
     default_columns = ["timestamp", "device_id", "flow_rate", "status", "water_level", "temperature"]
     
@@ -105,6 +112,26 @@ def load_data():
         return df
     return pd.DataFrame(columns=default_columns)
 
+def load_data(version):
+    """Shared across sessions: the CSV is parsed once per file change (version = mtime/size)"""
+    return shared_cache.get_or_compute(("load_data", version), _read_log)
+
+def get_zones(df, version, devices):
+    """Registry zones plus unregistered device IDs, computed once per data version"""
+    def compute():
+        device_ids = df['device_id'].dropna().unique() if not df.empty and 'device_id' in df.columns else []
+        return zone_options(devices, device_ids)
+    return shared_cache.get_or_compute(("zones", version, devices_version(devices)), compute)
+
+def filter_zone(df, version, zone, devices):
+    """Rows of the selected zone (all its registered devices), computed once per data version and zone"""
+    if zone == "All" or df.empty or 'device_id' not in df.columns:
+        return df
+    def compute():
+        zone_ids = set(devices_in_zone(devices, zone)['device_id']) or {zone}
+        return df[df['device_id'].isin(zone_ids)]
+    return shared_cache.get_or_compute(("zone_df", version, zone, devices_version(devices)), compute)
+
 # 5. AI Decision Logic
 def get_ai_recommendation(df, crop_type):
     """Generate AI-based irrigation recommendations based on sensor data"""
@@ -184,6 +211,21 @@ def get_ai_recommendation(df, crop_type):
         "temperature": temperature
     }
 
+def get_cached_recommendation(df, crop_type, version, zone, devices):
+    """Recommendation computed once per data version, zone (and its devices) and crop"""
+    return shared_cache.get_or_compute(
+        ("recommendation", version, zone, devices_version(devices), crop_type),
+        lambda: get_ai_recommendation(df, crop_type),
+    )
+
+def get_historical_metrics(df, version, zone, devices):
+    """Historical means computed once per data version and zone (and its devices)"""
+    def compute():
+        avg_flow = round(df['flow_rate'].mean(), 2) if not df.empty and 'flow_rate' in df.columns else 0
+        avg_temp = df['temperature'].mean() if not df.empty and 'temperature' in df.columns else None
+        return {"total": len(df), "avg_flow": avg_flow, "avg_temp": avg_temp}
+    return shared_cache.get_or_compute(("historical", version, zone, devices_version(devices)), compute)
+
 # 6. Calculate Efficiency Score
 def calculate_efficiency_score():
     """Calculate water savings compared to traditional manual watering"""
@@ -203,7 +245,8 @@ def calculate_efficiency_score():
 # 7. Sidebar Filters
 with st.sidebar:
     st.title("THE ENGRAMMERS")
-    st.write("🛠️ **Backend Status:** Connected")
+    live_feed.start()
+    st.write(f"🛠️ **Backend Status:** {'Connected (live)' if live_feed.connected else 'Offline'}")
     
     # Crop Selection
     st.markdown("### 🌾 Crop Configuration")
@@ -224,16 +267,16 @@ with st.sidebar:
     
     st.markdown("---")
     
-    # Auto-refresh toggle
-    auto_refresh = st.checkbox('Auto-refresh (10s)', value=True)
+    # Live updates toggle: re-render only when new readings/alerts arrive
+    auto_refresh = st.checkbox('Live updates', value=True)
     
     st.markdown("---")
-    df = load_data()
+    data_version = file_version(LOG_FILE)
+    df = load_data(data_version)
+    devices = load_devices()
 
-    # Zone selector based on device IDs
-    unique_zones = ["All"]
-    if not df.empty and 'device_id' in df.columns:
-        unique_zones += sorted([d for d in df['device_id'].dropna().unique()])
+    # Zone selector based on the device registry
+    unique_zones = get_zones(df, data_version, devices)
 
     selected_zone = st.selectbox("Select Zone", unique_zones, index=unique_zones.index(st.session_state.selected_zone) if st.session_state.selected_zone in unique_zones else 0)
     st.session_state.selected_zone = selected_zone
@@ -246,15 +289,20 @@ with st.sidebar:
         help="Utilisé pour calculer les économies de coûts (1 m³ = 1000 L).",
     )
 
+    st.markdown("---")
+    # Filled at the end of the script with cache hit rate and rerun time
+    perf_placeholder = st.empty()
+
 # 8. Filter logic (by zone)
-if st.session_state.selected_zone != "All" and not df.empty and 'device_id' in df.columns:
-    df = df[df['device_id'] == st.session_state.selected_zone]
+df = filter_zone(df, data_version, st.session_state.selected_zone, devices)
 
 # 9. Dashboard Header
 st.title("🌊 SMART WATER MANAGEMENT SYSTEM")
 st.caption(f"Last Updated: {time.strftime('%H:%M:%S')} | Crop: {st.session_state.selected_crop}")
 
-recommendation = get_ai_recommendation(df, st.session_state.selected_crop)
+recommendation = get_cached_recommendation(
+    df, st.session_state.selected_crop, data_version, st.session_state.selected_zone, devices
+)
 render_decision_box(recommendation, zone=st.session_state.selected_zone)
 
 # 11. Interactive Controls - Pump Buttons (via component)
@@ -267,6 +315,8 @@ render_analytics(
     total_water_saved=st.session_state.total_water_saved,
     water_cost_per_m3=st.session_state.water_cost_per_m3,
     selected_zone=st.session_state.selected_zone,
+    data_version=data_version,
+    registry_version=devices_version(devices),
 )
 
 # 13. Current Sensor Metrics
@@ -311,19 +361,17 @@ else:
 
 # 14. Historical Metrics
 st.markdown("### 📈 Historical Metrics")
+historical = get_historical_metrics(df, data_version, st.session_state.selected_zone, devices)
 col1, col2, col3 = st.columns(3)
 with col1:
-    st.metric("Total Readings", len(df))
+    st.metric("Total Readings", historical["total"])
 with col2:
-    avg_flow = round(df['flow_rate'].mean(), 2) if not df.empty and 'flow_rate' in df.columns else 0
+    avg_flow = historical["avg_flow"]
     st.metric("Avg Flow Rate", f"{avg_flow} L/min" if avg_flow > 0 else "N/A")
 with col3:
-    if not df.empty and 'temperature' in df.columns:
-        avg_temp = df['temperature'].mean()
-        if pd.notna(avg_temp):
-            st.metric("Avg Temperature", f"{avg_temp:.1f}°C")
-        else:
-            st.metric("Avg Temperature", "N/A")
+    avg_temp = historical["avg_temp"]
+    if avg_temp is not None and pd.notna(avg_temp):
+        st.metric("Avg Temperature", f"{avg_temp:.1f}°C")
     else:
         st.metric("Avg Temperature", "N/A")
 
@@ -339,55 +387,59 @@ if st.session_state.irrigation_history:
 else:
     st.info("No irrigation events recorded yet. Start the pump to begin tracking.")
 
+st.markdown("### 🗂️ Control Command Log")
+render_command_log(selected_zone=st.session_state.selected_zone)
+
 # 16. Map & Charts
 left_col, right_col = st.columns([2, 1])
 
 with left_col:
     st.subheader("📋 Sensor Data History (Real-time Log)")
-    if not df.empty:
-        # Select and order columns for display
-        display_columns = ['timestamp', 'device_id', 'flow_rate']
-        
-        # Add optional columns if they exist and have data
-        if 'temperature' in df.columns:
-            display_columns.append('temperature')
-        if 'water_level' in df.columns:
-            display_columns.append('water_level')
-        if 'status' in df.columns:
-            display_columns.append('status')
-        
-        # Filter to only columns that exist in dataframe
-        display_columns = [col for col in display_columns if col in df.columns]
-        
-        # Format the dataframe for better display
-        display_df = df[display_columns].sort_values(by='timestamp', ascending=False).copy()
-        
-        # Format numeric columns for better readability
-        if 'flow_rate' in display_df.columns:
-            display_df['flow_rate'] = display_df['flow_rate'].apply(lambda x: f"{x:.2f}" if pd.notna(x) else "N/A")
-        if 'temperature' in display_df.columns:
-            display_df['temperature'] = display_df['temperature'].apply(lambda x: f"{x:.1f}°C" if pd.notna(x) else "N/A")
-        if 'water_level' in display_df.columns:
-            display_df['water_level'] = display_df['water_level'].apply(lambda x: f"{x:.2f}m" if pd.notna(x) else "N/A")
-        
-        st.dataframe(display_df, use_container_width=True)
-    else:
-        st.info("No sensor data available. Waiting for sensor readings...")
+    render_sensor_history(
+        df,
+        data_version=data_version,
+        selected_zone=st.session_state.selected_zone,
+        registry_version=devices_version(devices),
+    )
 
 with right_col:
     st.subheader("📍 Sensor Locations")
-    # Mapping actual device IDs to dummy coordinates for the map
-    # In a real app, these would come from a database
-    map_points = pd.DataFrame({
-        'lat': [33.8938, 33.8950, 33.8910],
-        'lon': [-5.5547, -5.5520, -5.5580],
-        'device_id': ["SN-MEKNES-001", "SN-MEKNES-002", "SN-MEKNES-003"]
-    })
-    st.map(map_points)
+    # Coordinates come from the device registry (backend /devices or data/devices.json)
+    map_points = devices_in_zone(devices, st.session_state.selected_zone)
+    if map_points.empty:
+        st.info("No registered device in this zone.")
+    else:
+        st.map(map_points[['lat', 'lon']])
+        st.caption(f"{len(map_points):,} sensor(s)")
 
 # 17. Water savings are calculated when pump starts (handled in button click handler above)
 
-# 18. Real-time Auto-refresh
-if auto_refresh:
-    time.sleep(10)
-    st.rerun()
+# 18. Cache & rerun instrumentation
+rerun_timer.record(time.perf_counter() - rerun_started)
+cache_stats = shared_cache.stats()
+rerun_stats = rerun_timer.stats()
+perf_placeholder.caption(
+    f"⚡ Cache hit rate: {cache_stats['hit_rate']:.0%} "
+    f"({cache_stats['hits']} hits / {cache_stats['misses']} misses, {cache_stats['entries']} entries)  \n"
+    f"⏱️ Rerun: {rerun_stats['last_ms']:.0f} ms (avg {rerun_stats['avg_ms']:.0f} ms, max {rerun_stats['max_ms']:.0f} ms)"
+)
+
+# 19. Live updates
+# A full rerun only happens when the backend pushed a new reading/alert
+# (server-sent events) or the CSV changed. The check below is a small
+# fragment: no thread sleeps per session and nothing is redrawn when idle.
+LIVE_CHECK_SECONDS = 2
+
+def current_data_version():
+    return live_feed.version, file_version(LOG_FILE)
+
+st.session_state.seen_version = current_data_version()
+
+@st.fragment(run_every=LIVE_CHECK_SECONDS if auto_refresh else None)
+def watch_for_updates():
+    version = current_data_version()
+    if version != st.session_state.seen_version:
+        st.session_state.seen_version = version
+        st.rerun()
+
+watch_for_updates()
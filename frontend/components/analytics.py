@@ -1,11 +1,33 @@
 from __future__ import annotations
 
+import os
 from datetime import datetime
 from typing import Iterable
 
 import pandas as pd
+import requests
 import streamlit as st
 
+from components.cache import shared_cache
+from components.downsampling import DEFAULT_CHART_POINTS, downsample_frame
+
+
+TRENDS_API_URL = os.getenv("TRENDS_API_URL", "http://localhost:8000/analytics/trends")
+
+# Origine des tendances capteurs, affichée sous le graphique
+SOURCE_LABELS = {
+    "backend": "Sensor trends: backend time-series store (all readings ingested since the backend started)",
+    "local": "Sensor trends: local alert log (alert_logs.csv, alert rows only; backend unavailable or empty)",
+}
+
+
+def _bucket_start(timestamps: pd.Series, period: str) -> pd.Series:
+    """Premier jour de la période de chaque timestamp (vectorisé)."""
+    if period == "Daily":
+        return timestamps.dt.date
+    freq = "W" if period == "Weekly" else "M"
+    return timestamps.dt.to_period(freq).dt.start_time.dt.date
+
 
 def _build_irrigation_df(
     irrigation_history: Iterable[dict],
@@ -30,18 +52,8 @@ def _aggregate_irrigation_trends(df: pd.DataFrame, period: str) -> pd.DataFrame:
     if df.empty or "timestamp" not in df.columns or "volume" not in df.columns:
         return pd.DataFrame()
 
-    if period == "Daily":
-        df = df.copy()
-        df["bucket"] = df["timestamp"].dt.date
-    elif period == "Weekly":
-        df = df.copy()
-        df["bucket"] = df["timestamp"].dt.to_period("W").apply(lambda r: r.start_time.date())
-    else:  # Monthly
-        df = df.copy()
-        df["bucket"] = df["timestamp"].dt.to_period("M").apply(lambda r: r.start_time.date())
-
     grouped = (
-        df.groupby("bucket")["volume"]
+        df["volume"].groupby(_bucket_start(df["timestamp"], period).rename("bucket"))
         .sum()
         .reset_index()
         .rename(columns={"bucket": "Period", "volume": "Irrigation Volume (L)"})
@@ -49,28 +61,81 @@ def _aggregate_irrigation_trends(df: pd.DataFrame, period: str) -> pd.DataFrame:
     return grouped
 
 
+def _fetch_sensor_trends(period: str, selected_zone: str | None = None) -> pd.DataFrame | None:
+    """
+    Récupère les tendances déjà agrégées par le backend (/analytics/trends).
+    Retourne None si le backend est injoignable ou n'a pas encore de données.
+    """
+    params = {"period": period.lower(), "zone": selected_zone or "All"}
+    try:
+        response = requests.get(TRENDS_API_URL, params=params, timeout=2)
+        if response.status_code != 200:
+            return None
+        series = response.json().get("series", [])
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+    if not series:
+        return None
+
+    grouped = pd.DataFrame(series)
+    grouped["period"] = pd.to_datetime(grouped["period"]).dt.date
+    return grouped[["period", "flow_total", "flow_mean"]].rename(
+        columns={"period": "Period", "flow_total": "Flow Total (L/min)", "flow_mean": "Avg Flow (L/min)"}
+    )
+
+
 def _aggregate_sensor_trends(
     df: pd.DataFrame, period: str, selected_zone: str | None = None
-) -> pd.DataFrame:
-    """Agrège flow_rate des capteurs par période pour enrichir les tendances."""
-    if df.empty or "timestamp" not in df.columns or "flow_rate" not in df.columns:
-        return pd.DataFrame()
+) -> tuple[pd.DataFrame, str | None]:
+    """
+    Agrège flow_rate des capteurs par période pour enrichir les tendances.
+    Utilise l'agrégation du backend, sinon calcule localement à partir du CSV
+    (`df` est alors déjà filtré sur la zone sélectionnée).
+    Retourne (tendances, source), source étant une clé de SOURCE_LABELS (None sans données).
+    """
+    grouped = _fetch_sensor_trends(period, selected_zone)
+    if grouped is not None:
+        return grouped, "backend"
 
-    work = df.copy()
-    if selected_zone and selected_zone != "All" and "device_id" in work.columns:
-        work = work[work["device_id"] == selected_zone]
-    work["flow_rate"] = pd.to_numeric(work["flow_rate"], errors="coerce").fillna(0)
+    if df.empty or "timestamp" not in df.columns or "flow_rate" not in df.columns:
+        return pd.DataFrame(), None
 
-    if period == "Daily":
-        work["bucket"] = work["timestamp"].dt.date
-    elif period == "Weekly":
-        work["bucket"] = work["timestamp"].dt.to_period("W").apply(lambda r: r.start_time.date())
-    else:
-        work["bucket"] = work["timestamp"].dt.to_period("M").apply(lambda r: r.start_time.date())
+    work = df
+    flow = pd.to_numeric(work["flow_rate"], errors="coerce").fillna(0)
 
-    grouped = work.groupby("bucket")["flow_rate"].agg(sum="sum", mean="mean").reset_index()
+    grouped = flow.groupby(_bucket_start(work["timestamp"], period).rename("bucket")).agg(sum="sum", mean="mean").reset_index()
     grouped = grouped.rename(columns={"bucket": "Period", "sum": "Flow Total (L/min)", "mean": "Avg Flow (L/min)"})
-    return grouped
+    return grouped, "local"
+
+
+def _render_line_chart(chart_df: pd.DataFrame, key: str) -> None:
+    """
+    Trace une courbe en n'envoyant au navigateur qu'environ DEFAULT_CHART_POINTS
+    points par série (LTTB, les pics sont conservés). Pour les longues
+    historiques, un zoom sur une plage de temps et l'affichage brut restent possibles.
+    """
+    total = len(chart_df)
+    if total <= DEFAULT_CHART_POINTS:
+        st.line_chart(chart_df, use_container_width=True)
+        return
+
+    index = pd.to_datetime(chart_df.index)
+    lo, hi = index.min().to_pydatetime(), index.max().to_pydatetime()
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        zoom = st.slider("Time range", min_value=lo, max_value=hi, value=(lo, hi), key=f"{key}_zoom")
+    with col2:
+        show_raw = st.checkbox("Raw data", value=False, key=f"{key}_raw",
+                               help="Affiche tous les points de la plage sélectionnée.")
+
+    view = chart_df[(index >= zoom[0]) & (index <= zoom[1])]
+    if not show_raw:
+        view = downsample_frame(view, DEFAULT_CHART_POINTS)
+
+    st.line_chart(view, use_container_width=True)
+    st.caption(f"{len(view):,} of {total:,} points shown")
 
 
 def render_analytics(
@@ -79,9 +144,13 @@ def render_analytics(
     total_water_saved: float,
     water_cost_per_m3: float,
     selected_zone: str | None = None,
+    data_version=None,
+    registry_version=None,
 ) -> None:
     """
     Affiche la section Analytics (eau économisée, coûts, tendances).
+    Les tendances capteurs sont mises en cache par (version des données, version du registre
+    des capteurs, zone, période).
     """
     st.markdown("### 📊 Water Savings & Analytics")
 
@@ -135,10 +204,15 @@ def render_analytics(
                 .set_index("Time")
                 .sort_index()
             )
-            st.line_chart(chart_df, use_container_width=True)
+            _render_line_chart(chart_df, "events_chart")
     else:
         irrigation_trends = _aggregate_irrigation_trends(irrigation_df, trends_period)
-        sensor_trends = _aggregate_sensor_trends(df, trends_period, selected_zone)
+        # Backend results change without the CSV changing: keep them 10 s at most
+        sensor_trends, sensor_source = shared_cache.get_or_compute(
+            ("sensor_trends", data_version, registry_version, selected_zone, trends_period),
+            lambda: _aggregate_sensor_trends(df, trends_period, selected_zone),
+            ttl=10,
+        )
 
         chart_df = None
         if not irrigation_trends.empty and not sensor_trends.empty:
@@ -155,5 +229,7 @@ def render_analytics(
         else:
             display_cols = [c for c in chart_df.columns if c != "Period"]
             plot_data = chart_df.set_index("Period")[display_cols].fillna(0)
-            st.line_chart(plot_data, use_container_width=True)
+            _render_line_chart(plot_data, "trends_chart")
+            if not sensor_trends.empty:
+                st.caption(SOURCE_LABELS[sensor_source])
 
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Hashable
+
+
+class ResultCache:
+    """
+    Cache LRU partagé par toutes les sessions Streamlit du processus.
+
+    Les modules importés ne sont chargés qu'une fois par processus : une
+    instance créée ici est donc commune à tous les navigateurs connectés.
+    Les clés incluent la version des données (mtime du CSV), la zone, la
+    culture, la période... : un même calcul n'est fait qu'une fois par
+    changement de données.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], ttl: float | None = None) -> Any:
+        """
+        Retourne la valeur en cache pour `key`, ou l'obtient via `compute()`.
+        `ttl` (secondes) limite la durée de vie des résultats qui ne dépendent
+        pas seulement de la version du fichier (ex. appels au backend).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (now + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+def file_version(path: str) -> tuple[int, int] | None:
+    """Version d'un fichier de données : (mtime_ns, taille), None s'il n'existe pas."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class RerunTimer:
+    """Durées des dernières exécutions du script (toutes sessions confondues)."""
+
+    def __init__(self, window: int = 100):
+        self.durations: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.durations.append(seconds)
+
+    def stats(self) -> dict:
+        if not self.durations:
+            return {"last_ms": 0.0, "avg_ms": 0.0, "max_ms": 0.0}
+        durations = list(self.durations)
+        return {
+            "last_ms": durations[-1] * 1000,
+            "avg_ms": sum(durations) / len(durations) * 1000,
+            "max_ms": max(durations) * 1000,
+        }
+
+
+shared_cache = ResultCache()
+rerun_timer = RerunTimer()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import os
+
+import pandas as pd
+import requests
+import streamlit as st
+
+
+HISTORY_API_URL = os.getenv("HISTORY_API_URL", "http://localhost:8000/control/history")
+PAGE_SIZE = 50
+
+
+def _fetch_page(zone: str | None, before_id: int | None) -> dict | None:
+    """Une page du journal des commandes (plus récentes d'abord), None si le backend est injoignable."""
+    params = {"limit": PAGE_SIZE}
+    if zone and zone != "All":
+        params["zone"] = zone
+    if before_id is not None:
+        params["before_id"] = before_id
+
+    try:
+        response = requests.get(HISTORY_API_URL, params=params, timeout=2)
+        response.raise_for_status()
+        return response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+def render_command_log(selected_zone: str | None = None) -> None:
+    """
+    Journal persistant des commandes pompe/vanne (SQLite côté backend).
+    La pagination suit le curseur `next_before_id` : seule la page affichée est chargée.
+    """
+    # Pile des curseurs des pages déjà vues, remise à zéro quand la zone change
+    if st.session_state.get("command_log_zone") != selected_zone:
+        st.session_state.command_log_zone = selected_zone
+        st.session_state.command_log_cursors = [None]
+    cursors = st.session_state.command_log_cursors
+
+    page = _fetch_page(selected_zone, cursors[-1])
+    if page is None:
+        st.info("Command log unavailable (backend not reachable).")
+        return
+    if not page["items"]:
+        st.info("No control command logged yet.")
+        return
+
+    st.dataframe(pd.DataFrame(page["items"]).drop(columns=["id"]), use_container_width=True, hide_index=True)
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        if st.button("⬅ Newer", disabled=len(cursors) == 1, key="command_log_newer"):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("Older ➡", disabled=page["next_before_id"] is None, key="command_log_older"):
+            cursors.append(page["next_before_id"])
+            st.rerun()
+    with col3:
+        st.caption(f"Page {len(cursors)}")
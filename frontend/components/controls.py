@@ -14,8 +14,8 @@ def _call_control_api(action: str, zone: str | None = None) -> tuple[bool, str]:
     """
     Appelle l'API de contrôle de la pompe.
     """
-    payload = {"action": action}
-    if zone:
+    payload = {"command": action.upper()}
+    if zone and zone != "All":
         payload["zone"] = zone
 
     try:
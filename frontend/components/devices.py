@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import requests
+
+from components.cache import shared_cache
+
+
+DEVICES_API_URL = os.getenv("DEVICES_API_URL", "http://localhost:8000/devices")
+DEVICES_FILE = Path(__file__).resolve().parents[2] / "data" / "devices.json"
+
+DEVICE_COLUMNS = ["device_id", "zone", "lat", "lon", "type"]
+
+
+def _fetch_devices() -> pd.DataFrame:
+    """
+    Registre des capteurs (id, zone, coordonnées) depuis le backend,
+    ou depuis data/devices.json si le backend est injoignable.
+    """
+    try:
+        response = requests.get(DEVICES_API_URL, timeout=2)
+        response.raise_for_status()
+        devices = response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        try:
+            devices = json.loads(DEVICES_FILE.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            devices = []
+
+    return pd.DataFrame(devices, columns=DEVICE_COLUMNS)
+
+
+def load_devices() -> pd.DataFrame:
+    """Registre partagé entre sessions, rafraîchi au plus toutes les 60 s."""
+    return shared_cache.get_or_compute(("devices",), _fetch_devices, ttl=60)
+
+
+def devices_version(devices: pd.DataFrame) -> int:
+    """Empreinte du contenu du registre (change aussi si un capteur change de zone)."""
+    return int(pd.util.hash_pandas_object(devices, index=False).sum())
+
+
+def zone_options(devices: pd.DataFrame, device_ids) -> list[str]:
+    """
+    Zones du registre, puis les capteurs présents dans les données mais
+    pas encore enregistrés (sélectionnables individuellement).
+    """
+    zones = sorted(devices["zone"].dropna().unique())
+    known = set(devices["device_id"])
+    unregistered = sorted(d for d in device_ids if d not in known)
+    return ["All"] + zones + unregistered
+
+
+def devices_in_zone(devices: pd.DataFrame, zone: str) -> pd.DataFrame:
+    """Capteurs d'une zone du registre, ou le capteur dont l'id est `zone`."""
+    if zone == "All":
+        return devices
+    in_zone = devices[devices["zone"] == zone]
+    if in_zone.empty:
+        in_zone = devices[devices["device_id"] == zone]
+    return in_zone
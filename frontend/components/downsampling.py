@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_CHART_POINTS = 1000
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets : indices des `threshold` points qui
+    conservent au mieux la forme de la courbe (pics de fuite compris).
+    Le premier et le dernier point sont toujours gardés.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        # Moyenne du bucket suivant (le dernier point pour le dernier bucket)
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def minmax_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Décimation min/max : le minimum et le maximum de chaque bucket."""
+    n = len(y)
+    buckets = max(1, threshold // 2)
+    if threshold >= n:
+        return np.arange(n)
+
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    indices = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            chunk = y[start:end]
+            indices += [start + int(np.argmin(chunk)), start + int(np.argmax(chunk))]
+    return np.unique(indices)
+
+
+def downsample_frame(df: pd.DataFrame, target_points: int = DEFAULT_CHART_POINTS,
+                     method: str = "lttb") -> pd.DataFrame:
+    """
+    Réduit un DataFrame indexé par le temps à environ `target_points` lignes
+    par série avant de l'envoyer au navigateur. Les points retenus pour
+    chaque colonne sont réunis, donc aucun pic d'une série n'est perdu.
+    """
+    if len(df) <= target_points:
+        return df
+
+    index = df.index
+    if isinstance(index, pd.DatetimeIndex):
+        x = index.asi8.astype(float)
+    else:
+        x = np.arange(len(df), dtype=float)
+
+    keep = []
+    for column in df.columns:
+        values = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float)
+        if method == "minmax":
+            keep.append(minmax_indices(values, target_points))
+        else:
+            keep.append(lttb_indices(x, values, target_points))
+
+    return df.iloc[np.unique(np.concatenate(keep))]
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+import requests
+
+
+EVENTS_API_URL = os.getenv("EVENTS_API_URL", "http://localhost:8000/events")
+
+# Events that mean the dashboard has something new to show
+DATA_EVENTS = {"reading", "readings", "alert"}
+
+
+class LiveFeed:
+    """
+    Écoute le flux server-sent events du backend (/events).
+
+    Une seule connexion et un seul thread par processus Streamlit, quel que
+    soit le nombre de sessions : chaque session compare simplement `version`
+    à la dernière version affichée et ne relance le script que si elle a changé.
+    """
+
+    def __init__(self, url: str = EVENTS_API_URL):
+        self.url = url
+        self.version = 0
+        self.connected = False
+        self.last_event: dict | None = None
+        self._last_event_id: str | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        backoff = 1
+        while True:
+            try:
+                headers = {"Accept": "text/event-stream"}
+                if self._last_event_id:
+                    headers["Last-Event-ID"] = self._last_event_id
+
+                # Read timeout above the backend keepalive (15 s)
+                with requests.get(self.url, stream=True, headers=headers, timeout=(3, 60)) as response:
+                    response.raise_for_status()
+                    self.connected = True
+                    backoff = 1
+                    self._consume(response.iter_lines(decode_unicode=True))
+            except requests.exceptions.RequestException:
+                pass
+
+            self.connected = False
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _consume(self, lines) -> None:
+        event, data = None, []
+        for line in lines:
+            if line is None:
+                continue
+            if line.startswith("id:"):
+                self._last_event_id = line[3:].strip()
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
+            elif line == "":
+                if event in DATA_EVENTS:
+                    self.last_event = {"event": event, "data": "\n".join(data)}
+                    self.version += 1
+                event, data = None, []
+
+
+live_feed = LiveFeed()
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from components.cache import shared_cache
+
+
+DISPLAY_COLUMNS = ["timestamp", "device_id", "flow_rate", "temperature", "water_level", "status"]
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def _newest_first(timestamps: pd.Series) -> np.ndarray:
+    """
+    Positions des lignes triées du plus récent au plus ancien.
+    Seul un tableau d'indices est trié, le DataFrame n'est jamais recopié.
+    """
+    keys = timestamps.to_numpy(dtype="datetime64[ns]").view("i8")  # NaT = plus petit entier
+    return np.argsort(keys, kind="stable")[::-1]
+
+
+def _format_numbers(values: pd.Series, fmt: str, suffix: str = "") -> np.ndarray:
+    """Formatage vectorisé, "N/A" pour les valeurs manquantes."""
+    numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    missing = np.isnan(numbers)
+    formatted = np.char.add(np.char.mod(fmt, np.where(missing, 0.0, numbers)), suffix)
+    return np.where(missing, "N/A", formatted)
+
+
+def _format_page(page: pd.DataFrame) -> pd.DataFrame:
+    page = page.copy()
+    if "flow_rate" in page.columns:
+        page["flow_rate"] = _format_numbers(page["flow_rate"], "%.2f")
+    if "temperature" in page.columns:
+        page["temperature"] = _format_numbers(page["temperature"], "%.1f", "°C")
+    if "water_level" in page.columns:
+        page["water_level"] = _format_numbers(page["water_level"], "%.2f", "m")
+    return page
+
+
+def render_sensor_history(
+    df: pd.DataFrame,
+    data_version=None,
+    selected_zone: str | None = None,
+    registry_version=None,
+) -> None:
+    """
+    Affiche l'historique capteurs page par page.
+    Seule la page visible est extraite et formatée, quelle que soit la taille du DataFrame.
+    `registry_version` (devices_version du registre) change quand les capteurs d'une zone changent.
+    """
+    if df.empty:
+        st.info("No sensor data available. Waiting for sensor readings...")
+        return
+
+    columns = [col for col in DISPLAY_COLUMNS if col in df.columns]
+
+    # Ordre de tri partagé entre sessions, recalculé seulement si les données changent
+    order = shared_cache.get_or_compute(
+        ("sensor_history_order", data_version, selected_zone, registry_version),
+        lambda: _newest_first(df["timestamp"]),
+    )
+
+    total = len(order)
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key="sensor_history_page_size")
+    page_count = max(1, -(-total // page_size))
+    with col2:
+        page = st.number_input(
+            f"Page (1-{page_count})",
+            min_value=1,
+            max_value=page_count,
+            value=1,
+            step=1,
+            key="sensor_history_page",
+        )
+
+    start = (int(page) - 1) * page_size
+    stop = min(start + page_size, total)
+    visible = _format_page(df.iloc[order[start:stop]][columns])
+
+    st.dataframe(visible, use_container_width=True, hide_index=True)
+    st.caption(f"Rows {start + 1}-{stop} of {total:,}")
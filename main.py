@@ -1,28 +1,115 @@
-from fastapi import FastAPI
+import os
+from pathlib import Path
+from typing import List
+
+from fastapi import Depends, FastAPI, HTTPException, Query
 import numpy as np
 
-from ai_models.leak_detection import LeakDetector
-from ai_models.demand_forecasting.train_model import predict_demand
+from ai_models.dataset import data_version
+from ai_models.forecast_cache import forecast_cache
+from ai_models.leak_detection import FEATURES, LeakDetector
+from ai_models.model_registry import LEGACY_VERSION, registry
+from ai_models.streaming_anomaly import StreamingLeakDetector
+from ai_models.demand_forecasting.lstm_for_or import forecast_for_or
+from ai_models.demand_forecasting.train_model import demand_trace_stats, predict_demand, prewarm_demand
+from backend.auth import verify_admin_key
+from backend.profiler import ProfilerMiddleware, profiler, router as profiler_router
+
+BASE_DIR = Path(__file__).resolve().parent
 
 app = FastAPI()
 
-# Instantiate models once at startup
-leak_detector = None
-demand_model = None
+# On-demand sampling profiler for /predict/* (admin only, idle unless started)
+app.add_middleware(ProfilerMiddleware, profiler=profiler)
+app.include_router(profiler_router)
+
+# Leak model backend: "isolation_forest" (offline, pickled) or "half_space_trees" (online)
+LEAK_MODEL_BACKEND = os.getenv("LEAK_MODEL_BACKEND", "isolation_forest")
+
+# -----------------------
+# MODEL REGISTRY
+# -----------------------
+# Versioned artifacts (ai_models/model_registry.py); "legacy" is the original fixed paths
+def load_leak_model(directory: Path):
+    # The online backend learns from the readings it scores: no artifacts to load.
+    # Every version reuses the live detector, so deploys and rollbacks keep what it learned.
+    if LEAK_MODEL_BACKEND == "half_space_trees":
+        live = registry.active.get("leak")
+        if live is not None and isinstance(live.model, StreamingLeakDetector):
+            return live.model
+        return StreamingLeakDetector()
+    return LeakDetector(directory / "leak_detection_model.pkl", directory / "leak_scaler.pkl")
+
+
+def warm_leak_model(model):
+    # Do not feed a fake reading to the online model
+    if isinstance(model, LeakDetector):
+        model.predict({f: 0.0 for f in FEATURES})
+
+
+def load_keras_model(filename: str):
+    def loader(directory: Path):
+        from tensorflow.keras.models import load_model
+        return load_model(directory / filename, compile=False)
+    return loader
+
+
+def load_forecast_model(directory: Path):
+    import joblib
+    return load_keras_model("water_forecast_model.h5")(directory), joblib.load(directory / "scaler.pkl")
+
+
+registry.register("leak", load_leak_model, warm_leak_model, legacy_dir=BASE_DIR / "ai_models")
+# Warm-up traces the graph of every input length bucket
+registry.register("demand", load_keras_model("demand_model.h5"), prewarm_demand, legacy_dir=BASE_DIR / "ai_models")
+registry.register(
+    "forecast", load_forecast_model,
+    lambda loaded: loaded[0].predict(np.zeros((1, 12, 4)), verbose=0), legacy_dir=BASE_DIR / "models",
+)
 
 
 @app.on_event("startup")
 def load_models():
-    global leak_detector, demand_model
+    # Restore the versions active before the restart (legacy on first start)
+    for name in ("leak", "demand", "forecast"):
+        version = registry.saved_version(name)
+        try:
+            registry.deploy(name, version, wait=True)
+        except Exception:
+            if version == LEGACY_VERSION:
+                raise
+            print(f"Falling back to the legacy {name} model")
+            registry.deploy(name, LEGACY_VERSION, wait=True)
 
-    # Load class-based leak detector (loads model + scaler internally)
-    leak_detector = LeakDetector()
+    print("Models loaded successfully")
 
-    # Load LSTM demand model
-    from tensorflow.keras.models import load_model
-    demand_model = load_model("ai_models/demand_model.h5")
 
-    print("Models loaded successfully")
+@app.get("/admin/models", dependencies=[Depends(verify_admin_key)])
+def model_status():
+    """Active / previous / available versions with per-version usage and latency."""
+    return registry.status()
+
+
+@app.post("/admin/models/{name}/deploy/{version}", dependencies=[Depends(verify_admin_key)])
+def deploy_model(name: str, version: str):
+    """Loads and warms `version` in the background, then swaps it in."""
+    if name not in registry.specs:
+        raise HTTPException(status_code=404, detail=f"Unknown model {name}")
+    if version not in registry.versions(name):
+        raise HTTPException(status_code=404, detail=f"Model {name} has no version {version}")
+    if not registry.deploy(name, version):
+        raise HTTPException(status_code=409, detail=f"A deploy of {name} is already running")
+    return {"model": name, "version": version, "status": "loading"}
+
+
+@app.post("/admin/models/{name}/rollback", dependencies=[Depends(verify_admin_key)])
+def rollback_model(name: str):
+    if name not in registry.specs:
+        raise HTTPException(status_code=404, detail=f"Unknown model {name}")
+    version = registry.rollback(name)
+    if version is None:
+        raise HTTPException(status_code=409, detail=f"No previous {name} version in memory")
+    return {"model": name, "version": version, "status": "active"}
 
 
 # -----------------------
@@ -32,9 +119,11 @@ def load_models():
 def leak_prediction(sensor_data: dict):
     """
     Expects a JSON body with sensor feature keys.
-    Uses the class-based LeakDetector which handles ML + fallback internally.
+    Uses the class-based LeakDetector which handles ML + fallback internally
+    (or StreamingLeakDetector with LEAK_MODEL_BACKEND=half_space_trees).
     """
-    result = leak_detector.predict(sensor_data)
+    with registry.use("leak") as leak_detector:
+        result = leak_detector.predict(sensor_data)
     return result
 
 
@@ -42,10 +131,72 @@ def leak_prediction(sensor_data: dict):
 # DEMAND FORECAST API
 # -----------------------
 @app.post("/predict/demand")
-def demand_prediction(data: list):
+def demand_prediction(data: List[float]):
     """
     Expects a list of historical demand values.
     Returns the predicted next-hour demand.
+    The history is padded / truncated to a fixed length bucket (train_model.DEMAND_BUCKETS).
     """
-    result = predict_demand(demand_model, data)
+    if not data:
+        raise HTTPException(status_code=422, detail="Demand history is empty")
+    with registry.use("demand") as demand_model:
+        result = predict_demand(demand_model, data)
     return result
+
+
+@app.get("/predict/demand/traces")
+def demand_traces():
+    """Graph traces per length bucket; stays at one per bucket after warm-up."""
+    return demand_trace_stats()
+
+
+# -----------------------
+# GROUNDWATER FORECAST API
+# -----------------------
+FORECAST_TARGETS = ("Depth_to_Groundwater_P24", "Depth_to_Groundwater_P25")
+MAX_FORECAST_STEPS = 168
+
+
+@app.get("/forecast")
+def groundwater_forecast(
+    steps: int = Query(24, ge=1, le=MAX_FORECAST_STEPS),
+    target_column: str = "Depth_to_Groundwater_P24",
+):
+    """
+    Multi-step groundwater depth forecast (lstm_for_or.forecast_for_or).
+    Computed once per (data version, model version, target, steps) and shared
+    by all callers; concurrent requests for a missing entry wait for one computation.
+    """
+    if target_column not in FORECAST_TARGETS:
+        raise HTTPException(status_code=422, detail=f"target_column must be one of {list(FORECAST_TARGETS)}")
+
+    served = registry.get("forecast")
+    key = (data_version(), served.version, target_column, steps)
+
+    def compute():
+        model, scaler = served.model
+        with served.track():
+            forecast = forecast_for_or(steps=steps, target_column=target_column, model=model, scaler=scaler)
+        return [
+            {"timestamp": ts.isoformat(), "predicted_depth": float(depth)}
+            for ts, depth in zip(forecast["Timestamp"], forecast["Predicted_Depth"])
+        ]
+
+    try:
+        points, cached = forecast_cache.get(key, compute)
+    except ValueError as e:
+        # e.g. the served scaler was fitted on another well
+        raise HTTPException(status_code=422, detail=str(e))
+    return {
+        "target_column": target_column,
+        "steps": steps,
+        "data_version": key[0],
+        "model_version": served.version,
+        "cached": cached,
+        "forecast": points,
+    }
+
+
+@app.get("/forecast/cache")
+def forecast_cache_stats():
+    return forecast_cache.stats()
@@ -4,6 +4,7 @@ import time
 import random
 import numpy as np
 import os
+import sys
 from pathlib import Path
 
 # Updated API_URL to match FastAPI port
@@ -11,24 +12,39 @@ API_URL = os.getenv("API_URL", "http://localhost:8000/ingest")
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 CSV_PATH = PROJECT_ROOT / "data" / "Aquifer_Petrignano.csv"
 
+# Shared dataset loader (parsed once, cached as .npz)
+try:
+    from ai_models.dataset import load_columns
+except ImportError:
+    sys.path.append(str(PROJECT_ROOT))
+    from ai_models.dataset import load_columns
+
+# Device credentials: a per-device key (POST /admin/device-keys/Zone_A_01) gives the
+# sensor its own ingest quota; the shared DEVICE_API_KEY only gets a per-address one
+DEVICE_ID = "Zone_A_01"
+DEVICE_KEY = os.getenv("DEVICE_KEY") or os.getenv("DEVICE_API_KEY")
+HEADERS = {"Authorization": DEVICE_KEY} if DEVICE_KEY else {}
+
 def start_sensor():
     print(" Updated Virtual Sensor Started...")
     
     try:
-        df = pd.read_csv(CSV_PATH)
-        
-        for index, row in df.iterrows():
-            
-            # Extracting values and handling empty (NaN) cells
-            flow = row['Volume_C10_Petrignano'] if not pd.isna(row['Volume_C10_Petrignano']) else 0
-            # Renaming 'pressure' to 'water_level' as requested
-            level = row['Depth_to_Groundwater_P24'] if not pd.isna(row['Depth_to_Groundwater_P24']) else 0
-            # Adding Temperature column
-            temp = row['Temperature_Petrignano'] if not pd.isna(row['Temperature_Petrignano']) else 20.0
+        volumes, depths, temperatures = load_columns(
+            'Volume_C10_Petrignano', 'Depth_to_Groundwater_P24', 'Temperature_Petrignano', path=CSV_PATH
+        )
+
+        # Handling empty (NaN) cells for all rows at once
+        flows = np.nan_to_num(volumes, nan=0.0)
+        # Renaming 'pressure' to 'water_level' as requested
+        levels = np.nan_to_num(depths, nan=0.0)
+        # Adding Temperature column
+        temps = np.nan_to_num(temperatures, nan=20.0)
+
+        for index, (flow, level, temp) in enumerate(zip(flows, levels, temps)):
 
             # Updated JSON Format
             payload = {
-                "device_id": "Zone_A_01", # Renamed from sensor_id
+                "device_id": DEVICE_ID, # Renamed from sensor_id
                 "flow_rate": abs(float(flow)), 
                 "water_level": abs(float(level)), # Renamed from pressure
                 "temperature": float(temp), # New field
@@ -37,7 +53,7 @@ def start_sensor():
             }
 
             try:
-                response = requests.post(API_URL, json=payload) 
+                response = requests.post(API_URL, json=payload, headers=HEADERS)
                 print(f"Data sent: Row {index} | Status: {response.status_code}")
             except requests.exceptions.ConnectionError:
                 print(f"Connection Error: Backend (FastAPI) at {API_URL} not found.") 